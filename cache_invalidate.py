@@ -0,0 +1,35 @@
+'''
+This script removes stale entries from the response, LLM request and semantic caches.
+Expired entries and entries generated with a different prompt version
+(schema, guidelines or few-shot examples changed) are always removed, as are
+semantic cache entries embedded with a different embedding model.
+
+    python cache_invalidate.py                  # drop expired and stale-version entries
+    python cache_invalidate.py --older-than 3   # also drop entries older than 3 days
+'''
+import argparse
+from prompts.prompt import prompt_version
+from utils.schema_loader import SchemaLoader
+from utils.config import DB_PATH, SCHEMA_PATH, LLM_CACHE_TABLE
+from utils.response_cache import ResponseCache
+from utils.semantic_cache import SemanticCache
+
+def main():
+    """
+    Purges the response, LLM request and semantic caches and reports how many entries were removed.
+    """
+    parser = argparse.ArgumentParser(description="Remove stale cached SQL queries.")
+    parser.add_argument("--older-than", type=float, metavar="DAYS",
+                        help="also remove entries created more than DAYS days ago")
+    args = parser.parse_args()
+
+    version = prompt_version(SchemaLoader(db_path=DB_PATH, schema_path=SCHEMA_PATH).get_schema())
+    max_age = args.older_than * 24 * 60 * 60 if args.older_than is not None else None
+    responses = ResponseCache(version).purge(max_age)
+    requests = ResponseCache(version, table=LLM_CACHE_TABLE).purge(max_age)
+    semantic = SemanticCache(version).purge(max_age)
+    print(f"Prompt version {version}: removed {responses} response, {requests} LLM request "
+          f"and {semantic} semantic cache entries")
+
+if __name__ == "__main__":
+    main()
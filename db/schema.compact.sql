@@ -0,0 +1,16 @@
+CREATE TABLE orders (order_id TEXT, customer_id TEXT, order_status TEXT, order_purchase_timestamp DATETIME, order_approved_at DATETIME, order_delivered_carrier_date DATETIME, order_delivered_customer_date DATETIME, order_estimated_delivery_date DATETIME);
+-- FK: orders.customer_id -> customers.customer_id (placed_by)
+CREATE TABLE order_items (order_id TEXT, order_item_id INTEGER, product_id TEXT, seller_id TEXT, shipping_limit_date DATETIME, price REAL, freight_value REAL);
+-- FK: order_items.order_id -> orders.order_id (contains)
+-- FK: order_items.product_id -> products.product_id (includes)
+-- FK: order_items.seller_id -> sellers.seller_id (sold_by)
+CREATE TABLE order_payments (order_id TEXT, payment_sequential INTEGER, payment_type TEXT, payment_installments INTEGER, payment_value REAL);
+-- FK: order_payments.order_id -> orders.order_id (has)
+CREATE TABLE order_reviews (review_id TEXT, order_id TEXT, review_score INTEGER, review_comment_title TEXT, review_comment_message TEXT, review_creation_date DATETIME, review_answer_timestamp DATETIME);
+-- FK: order_reviews.order_id -> orders.order_id (has)
+CREATE TABLE customers (customer_id TEXT, customer_unique_id TEXT, customer_zip_code_prefix TEXT, customer_city TEXT, customer_state TEXT);
+-- FK: customers.customer_zip_code_prefix -> geolocation.geolocation_zip_code_prefix (located_in)
+CREATE TABLE sellers (seller_id TEXT, seller_zip_code_prefix TEXT, seller_city TEXT, seller_state TEXT);
+-- FK: sellers.seller_zip_code_prefix -> geolocation.geolocation_zip_code_prefix (located_in)
+CREATE TABLE products (product_id TEXT, product_category_name TEXT, product_name_length INTEGER, product_description_length INTEGER, product_photos_qty INTEGER, product_weight_g REAL, product_length_cm REAL, product_height_cm REAL, product_width_cm REAL);
+CREATE TABLE geolocation (geolocation_zip_code_prefix TEXT, geolocation_lat REAL, geolocation_lng REAL, geolocation_city TEXT, geolocation_state TEXT);
@@ -1,82 +1,309 @@
 '''
 This script generates SQL queries from natural language questions using OpenAI's API.'
 '''
-import json
+import re
+import atexit
+import asyncio
 import pprint
+import functools
 import openai
-from prompts.prompt import SystemPrompt, UserPrompt, DefineFewShotExamples
+from prompts.prompt import build_system_message, build_user_message, check_prompt_cacheable, prompt_version
 from utils.schema_loader import SchemaLoader
-from utils.config import DB_PATH, SCHEMA_PATH, setup_logger
-from reasoning.openai_client import OpenAIClient
+from utils.config import (DB_PATH, SCHEMA_PATH, SQL_TEMPERATURE, ENABLE_CATEGORY_TRANSLATION,
+                          SEMANTIC_CACHE_HIT_THRESHOLD, SEMANTIC_CACHE_VERIFY_THRESHOLD,
+                          MAX_CONCURRENT_REQUESTS, LLM_CACHE_TABLE, setup_logger)
+from utils.response_cache import ResponseCache, cached_response, make_cache_key, normalize_question
+from utils.semantic_cache import SemanticCache
+from utils.category_matcher import CategoryMatcher
+from reasoning.openai_client import OpenAIClient, RefusalError
 
 logger = setup_logger(__name__)
 
-def main(question):
+# Loaded once per process; the schema and categories do not change at runtime.
+_schema_loader = SchemaLoader(db_path=DB_PATH, schema_path=SCHEMA_PATH)
+atexit.register(_schema_loader.close)
+SCHEMA = _schema_loader.get_schema()
+
+PROMPT_VERSION = prompt_version(SCHEMA)
+
+response_cache = ResponseCache(PROMPT_VERSION)
+semantic_cache = SemanticCache(PROMPT_VERSION)
+
+# A single event loop is reused across calls, so async clients created on it
+# stay usable between questions. Created directly rather than through
+# asyncio.Runner, which needs Python 3.11.
+_loop = asyncio.new_event_loop()
+
+@atexit.register
+def _close_loop():
+    try:
+        _loop.run_until_complete(_loop.shutdown_asyncgens())
+    finally:
+        _loop.close()
+
+def run(coro):
+    """
+    Runs a coroutine to completion on the shared event loop.
+
+    Parameters
+    ----------
+        coro (Coroutine): The coroutine to run.
+
+    Returns
+    -------
+        Any: The coroutine's result.
+    """
+    return _loop.run_until_complete(coro)
+
+@functools.lru_cache(maxsize=1)
+def get_client():
+    """
+    Builds the OpenAI client once, on first use. The client is reused by
+    every question, so its connection pool keeps TLS connections alive.
+
+    Returns
+    -------
+        OpenAIClient: The shared client, backed by the LLM request cache.
+    """
+    return OpenAIClient(cache=ResponseCache(PROMPT_VERSION, table=LLM_CACHE_TABLE))
+
+_category_matcher = None
+
+def get_category_matcher():
+    """
+    Builds the product category matcher once, on first use. A matcher over no
+    categories is not kept, so a failed read is retried on the next call.
+
+    Returns
+    -------
+        CategoryMatcher: Matcher over the product categories in the database.
+    """
+    global _category_matcher
+    if _category_matcher is not None:
+        return _category_matcher
+    categories = _schema_loader.read_product_categories()
+    matcher = CategoryMatcher(categories)
+    if categories:
+        _category_matcher = matcher
+    return matcher
+
+# Quoted values and numbers in a question; the SQL filters on them.
+# A quote directly after a letter is an apostrophe, as in "what's".
+_LITERAL = re.compile(r"(?<!\w)'[^']+'|\"[^\"]+\"|\d+(?:[.,]\d+)*")
+
+def same_literals(question, cached_question):
+    """
+    Checks whether two questions name the same product categories, quoted
+    values and numbers. Embeddings of questions that only differ in these are
+    very close, while their SQL queries filter on different values.
+
+    Parameters
+    ----------
+        question (str): User's question, normalized.
+        cached_question (str): A previously answered question, normalized.
+
+    Returns
+    -------
+        bool: True if both questions carry the same literals.
+    """
+    matcher = get_category_matcher()
+    return (matcher.match(question) == matcher.match(cached_question)
+            and sorted(_LITERAL.findall(question)) == sorted(_LITERAL.findall(cached_question)))
+
+def warm_up():
+    """
+    Populates the provider's prompt cache with the static system prompt,
+    so the first question does not pay for the full prefix, and warns if
+    the prompt is too short to be cached at all. Failures are logged, not raised.
+    """
+    try:
+        system_message = build_system_message(SCHEMA)
+        check_prompt_cacheable(system_message["content"])
+        run(get_client().warm_prompt_cache(system_message["content"]))
+    # Only an optimization and a diagnostic, so no failure may keep questions from being answered,
+    # e.g. tiktoken failing to download its encoding while offline.
+    except Exception as e:
+        logger.warning("Prompt cache warm-up failed: %s", e)
+
+@cached_response(PROMPT_VERSION, response_cache)
+async def generate_sql(question, translation=None):
     """
     Generates an SQL query from a natural language question using OpenAI.
+    Results are served from the response cache when the same question
+    has already been answered with the same prompts and schema, and from
+    the semantic cache when a question with the same intent has.
+    Product categories named in the question are translated with a local
+    lookup; only when none are found is the LLM asked to translate them,
+    concurrently with the semantic cache lookup, unless a translation was
+    passed in. Translation is skipped entirely when ENABLE_CATEGORY_TRANSLATION is off.
 
     Parameters
     ----------
         question (str): User's question in natural language.
+        translation (QueryProcessor, optional): Category translation obtained beforehand,
+            e.g. by a batch translation in `main_batch`.
 
     Returns
     -------
-        str: Generated SQL query or an error message.
+        str: Generated SQL query.
+
+    Raises
+    ------
+        openai.APIError: If the OpenAI API request fails.
+        openai.LengthFinishReasonError: If the SQL query does not fit in SQL_MAX_TOKENS tokens.
+        RefusalError: If the model refused to write the SQL query or to score it.
     """
-    schema = SchemaLoader(db_path=DB_PATH, schema_path=SCHEMA_PATH)
-    few_shot_examples = DefineFewShotExamples().get_few_shot_prompts()
-    system_prompt = SystemPrompt(
-        role="system",
-        db_schema=schema.get_schema(),
-        query=question.lower(),
-        examples=few_shot_examples,
-        portugese_category_translation=schema.read_product_categories(),
-    )
-    user_prompt = UserPrompt(
-        role="user",
-        query=question.lower(),
-    )
+    openai_client = get_client()
+    categories = get_category_matcher().match(question) if ENABLE_CATEGORY_TRANSLATION else {}
+    translation_task = None
+    if ENABLE_CATEGORY_TRANSLATION and not categories and translation is None:
+        translation_task = asyncio.create_task(
+            openai_client.expand_and_translate_categories(question.lower(),
+                                                          _schema_loader.read_product_categories(),
+                                                          temperature=0.3))
+    normalized_question = normalize_question(question)
     try:
-        openai_client = OpenAIClient()
-        product_translation = openai_client.expand_and_translate_categories(question.lower(),
-                                                      schema.read_product_categories(),
-                                                      temperature=0.3)
-        logger.info("Product Translation: %s", product_translation)
+        embedding = await openai_client.get_embedding(normalized_question)
+        match = semantic_cache.lookup(embedding)
+        # A close match is only reused directly if it filters on the same values,
+        # otherwise it is verified like a match in the gray zone.
+        if match and match.similarity >= SEMANTIC_CACHE_VERIFY_THRESHOLD and (
+                (match.similarity >= SEMANTIC_CACHE_HIT_THRESHOLD
+                 and same_literals(normalized_question, match.question))
+                or await openai_client.is_same_intent(question, match.question)):
+            logger.info("Semantic cache hit (%.3f) for question: %s", match.similarity, question)
+            if translation_task:
+                translation_task.cancel()
+            return match.sql
+    except BaseException:
+        if translation_task:
+            translation_task.cancel()
+        raise
 
-        messages=[
-            {
-                "role": system_prompt.role ,
-                "content": system_prompt.to_prompt(product_translation.expanded_query)
-            },
+    if translation_task:
+        try:
+            translation = await translation_task
+        except RefusalError as e:
+            logger.warning("Category translation refused: %s", e)
+    if translation is not None:
+        logger.debug("Product Translation: %s", translation)
+        category_translation = translation.expanded_query
+    elif categories:
+        category_translation = CategoryMatcher.render(categories)
+        logger.info("Matched categories: %s", category_translation)
+    else:
+        category_translation = None
+
+    messages=[
+        build_system_message(SCHEMA),
+        build_user_message(question.lower(), category_translation)
+    ]
+
+    response = await openai_client.get_response(messages, temperature=SQL_TEMPERATURE)
+    feedback = await openai_client.get_feedback(question.lower(), response.query, temperature=0)
+    logger.info("Feedback score: %s", feedback.score)
+    logger.debug("Feedback: %s", feedback.feedback)
+    if feedback.score < 8:
+        logger.warning("Feedback score is low: %s", feedback.score)
+        messages.append(
             {
-                "role": user_prompt.role ,
-                "content": user_prompt.to_prompt()
+                "role": "assistant",
+                "content": feedback.feedback
             }
-        ]
-
-        response = openai_client.get_response(messages, temperature=0.7)
-        feedback = openai_client.get_feedback(question.lower(), response, temperature=0)
-        logger.info("Feedback: %s", feedback)
-        if feedback.score < 8:
-            logger.warning("Feedback score is low: %s", feedback.score)
-            messages.append(
-                {
-                    "role": "assistant",
-                    "content": feedback.feedback
-                }
-            )
-            response = openai_client.get_response(messages, temperature=0.7)
-        logger.info("Response from OpenAI: %s", response)
-
-        # Parse the response as JSON
-        response_data = json.loads(response)
-
-        # Extract only the SQL query from the response
-        return response_data.get("query", "No query found in response")
-    except openai.APIError as e:
+        )
+        response = await openai_client.get_response(messages, temperature=SQL_TEMPERATURE)
+    logger.debug("Response from OpenAI: %s", response)
+
+    sql_query = response.query
+    semantic_cache.insert(normalized_question, embedding, sql_query)
+    return sql_query
+
+def main(question):
+    """
+    Generates an SQL query from a natural language question using OpenAI.
+
+    Parameters
+    ----------
+        question (str): User's question in natural language.
+
+    Returns
+    -------
+        str: Generated SQL query or an error message.
+    """
+    try:
+        return run(generate_sql(question))
+    except RefusalError as e:
+        logger.warning("SQL generation refused: %s", e)
+        return f"SQL query cannot be written for this: {e}"
+    # OpenAIError also covers failures without an HTTP error, e.g. a completion cut off at SQL_MAX_TOKENS.
+    except openai.OpenAIError as e:
         logger.error("OpenAI API error : %s", e)
         return f"OpenAI API error : {e}"
 
+async def _translate_batch(questions):
+    translations = [None] * len(questions)
+    if not ENABLE_CATEGORY_TRANSLATION:
+        return translations
+    matcher = get_category_matcher()
+    # Questions already in the response cache are answered without a translation,
+    # and would only change the batch request (and its LLM cache key).
+    pending = [i for i, question in enumerate(questions)
+               if not matcher.match(question)
+               and response_cache.get(make_cache_key(question, PROMPT_VERSION)) is None]
+    # A single question is translated concurrently with its semantic cache lookup instead.
+    if len(pending) < 2:
+        return translations
+    try:
+        results = await get_client().expand_batch([questions[i].lower() for i in pending],
+                                                  _schema_loader.read_product_categories(),
+                                                  temperature=0.3)
+    except openai.OpenAIError as e:
+        logger.warning("Batch category translation failed: %s", e)
+        return translations
+    for i, result in zip(pending, results):
+        translations[i] = result
+    return translations
+
+async def _generate_batch(questions):
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    translations = await _translate_batch(questions)
+
+    async def one(question, translation):
+        async with semaphore:
+            try:
+                return await generate_sql(question, translation=translation)
+            except RefusalError as e:
+                logger.warning("SQL generation refused: %s", e)
+                return f"SQL query cannot be written for this: {e}"
+            except openai.OpenAIError as e:
+                logger.error("OpenAI API error : %s", e)
+                return f"OpenAI API error : {e}"
+            # Any other failure is also reported per question, so it does not abort the whole batch.
+            except Exception as e:
+                logger.exception("SQL generation failed for question: %s", question)
+                return f"SQL generation error : {e}"
+
+    return await asyncio.gather(*(one(question, translation)
+                                  for question, translation in zip(questions, translations)))
+
+def main_batch(questions):
+    """
+    Generates SQL queries for several questions concurrently, with at most
+    MAX_CONCURRENT_REQUESTS questions in flight. Questions that need the LLM
+    to translate product categories are translated together, in one request.
+
+    Parameters
+    ----------
+        questions (list): User questions in natural language.
+
+    Returns
+    -------
+        list: Generated SQL query for each question, in order. A question that
+        fails gets an error message instead, the others are still answered.
+    """
+    return run(_generate_batch(questions))
+
 if __name__ == "__main__":
     QUESTION = "How many customers have placed orders worth more than $5000 in total?"
+    warm_up()
     pprint.pp(main(QUESTION))
@@ -1,38 +1,24 @@
 """
-This module contains the base classes for the prompt generation task.
+This module contains the building blocks for the prompt generation task.
 """
-from typing import Optional
-from abc import ABC, abstractmethod
-from pydantic import BaseModel, Field
+import textwrap
+from dataclasses import dataclass, field
 
-class BasePrompt(BaseModel, ABC):
+def canonicalize(text: str) -> str:
     """
-    Represents a base class for the prompt generation task.
-
-    Attributes
-    ----------
-    role : str
-        Represents the users role.
-    query : str
-        The user query.
-
-    Methods
-    -------
-    to_prompt()
-        Returns the prompt as a Markdown string.
+    Returns the text in a canonical form: dedented, without trailing whitespace
+    on any line, LF line endings and exactly one trailing newline. Prompts built
+    from canonical parts are byte-identical across code paths, which the provider's
+    exact-prefix prompt cache relies on.
     """
-    role: str = Field(description="The role of the user.")
-    query: str = Field(description="The user query.")
-
-    @abstractmethod
-    def to_prompt(self, portugese_category_translation: Optional[str]=None):
-        """
-        Returns the prompt as a Markdown string.
-        """
+    return "\n".join(line.rstrip() for line in textwrap.dedent(text).splitlines()).strip() + "\n"
 
-class FewShotExample(BaseModel):
+@dataclass(frozen=True, slots=True)
+class FewShotExample:
     """
     Represents a few-shot example for the SQL query generation task.
+    The examples are static, so this is a plain frozen dataclass and the
+    canonical rendering is computed once, at construction.
 
     Attributes
     ----------
@@ -40,17 +26,12 @@ class FewShotExample(BaseModel):
         The input query.
     output : str
         The expected SQL query output.
-
-    Methods
-    -------
-    render()
-        Returns the few-shot example as a string.
+    rendered : str
+        The few-shot example as a canonical string.
     """
     input: str
     output: str
+    rendered: str = field(init=False, repr=False)
 
-    def render(self) -> str:
-        """
-        Returns the few-shot examples as a string.
-        """
-        return f"User: {self.input}\nAssistant: {self.output}\n"
+    def __post_init__(self):
+        object.__setattr__(self, "rendered", canonicalize(f"User: {self.input}\nAssistant: {self.output}\n"))
@@ -1,119 +1,168 @@
 """
-This module contains Pydantic models for the SQL query generation prompt.
+This module builds the messages for the SQL query generation prompt.
 """
-from typing import List, Optional
-from pydantic import Field
-from prompts.base import BasePrompt, FewShotExample
+import hashlib
+import textwrap
+import functools
+from typing import Optional, Tuple
+import tiktoken
+from prompts.base import FewShotExample, canonicalize
+from utils.config import MODEL, ENABLE_CATEGORY_TRANSLATION, setup_logger
 
-class SystemPrompt(BasePrompt):
+logger = setup_logger(__name__)
+
+# OpenAI only caches prompts with at least this many tokens.
+MIN_CACHEABLE_PROMPT_TOKENS = 1024
+
+_GUIDELINES = textwrap.dedent("""\
+    You are an expert in SQL, SQLite databases, and data analysis.
+    You work as a Data Analyst in an **E-commerce Analytics Team**.
+
+    ### **Your Role**
+        Your job is to generate **accurate, optimized, and executable SQL queries**
+        to answer user questions based on the provided database schema.
+
+    ### **SQL Query Guidelines**
+        - Return only **the exact output format** as expected in the question.
+        - **Do not include extra columns** unless explicitly asked.
+        - For **percentage calculations**, round results to **2 decimal places**.
+        - For **string outputs**, return only the requested value (no extra info).
+        - For **counts/sums**, ensure correct aggregation and filtering.
+        - **Use only tables and columns defined in the schema.**
+        - **Do NOT assume relationships unless explicitly defined.**
+        - **If a table/column does not exist, respond with:** `"SQL query cannot be written for this."`
+        - **Ensure queries are compatible with SQLite (no unsupported functions).**
+        - **Avoid `SELECT *`, select only necessary columns when required.**
+        - **Use joins and filtering effectively for performance.**
+        - When calculating the percentage of a condition (e.g. % of 5-star reviews), use:
+            (COUNT(CASE WHEN condition THEN 1 END) * 100.0 / COUNT(*))
+        - Apply filters like `HAVING COUNT(*) > 100` to ensure statistical significance.
+        - Return only the column(s) specified in the expected output format.
+        - If the question says "[integer: installment count]", only include that field.
+        - Do NOT include helper metrics like COUNT, unless explicitly requested.
+        - When comparing group-level averages (e.g. average freight per city), use:
+            - GROUP BY
+            - HAVING COUNT(...) to filter out low-volume entries
+        - **Use nested queries for advanced aggregation.**
+        - **Do not generate queries that modify data** (`DELETE`, `UPDATE`, `DROP` are prohibited).
+        - If the user message lists **product category translations**,
+          use the exact Portuguese name in the SQL query.
+
+    ### **Expected Response Format**
+        - **Return only the SQL query as raw text without Markdown formatting**.
+        - The query should be **fully executable** in SQLite.
+
+    """)
+
+_SCHEMA_TEMPLATE = textwrap.dedent("""\
+    ### Database schema is attached below. Note the relationships between invoices, customers and services.
+    ```sql
+    {db_schema}
+    ```
+    ---
+    """)
+
+_EXAMPLES_TEMPLATE = textwrap.dedent("""\
+    ### **Here are some examples**:
+    {few_shot_examples}
+    """)
+
+@functools.lru_cache(maxsize=8)
+def _static_system_sections(db_schema: str) -> Tuple[str, str, str]:
+    """
+    Renders the guidelines, schema and examples sections once per schema,
+    so every request sends a byte-identical prefix and provider-side
+    prompt caching can engage.
+    """
+    return (canonicalize(_GUIDELINES),
+            canonicalize(_SCHEMA_TEMPLATE.format(db_schema=db_schema.strip())),
+            canonicalize(_EXAMPLES_TEMPLATE.format(few_shot_examples=RENDERED_FEW_SHOTS)))
+
+@functools.lru_cache(maxsize=8)
+def _static_system_prompt(db_schema: str) -> str:
+    return "\n".join(_static_system_sections(db_schema))
+
+@functools.lru_cache(maxsize=8)
+def prompt_version(db_schema: str, category_translation: bool = ENABLE_CATEGORY_TRANSLATION) -> str:
     """
-    Represents the system prompt for the SQL query generation task.
+    Returns a short hash of everything that shapes the generated SQL: the static
+    system prompt (guidelines, schema and few-shot examples), the user prompt
+    template and whether category translations are added to it. Caches include
+    it in their keys, so changing any of these invalidates previously cached queries.
 
-    Attributes
+    Parameters
     ----------
-    examples : List[FewShotExample]
-        A list of few-shot examples to guide the model.
     db_schema : str
-        The database schema in Mermaid format.
+        The database schema.
+    category_translation : bool
+        Whether user prompts include translated product categories.
 
-    Methods
+    Returns
     -------
-    to_prompt() -> str
-        Returns the system prompt as a Markdown string.
+    str
+        The first 12 hex digits of the SHA-256 of the prompts.
     """
-    examples: List[FewShotExample] = []
-    db_schema: str = Field(description="The database schema in Mermaid format.")
-
-    def to_prompt(self, portugese_category_translation: Optional[str]=None) -> str:
-        """
-        This method constructs a detailed system prompt that includes the role of the model,
-        guidelines for SQL query generation, and a few-shot example section.
-        The prompt is formatted in Markdown for better readability.
-
-        Returns
-        -------
-        str
-            The system prompt as a Markdown string.
-        """
-        few_shot_examples = "\n".join([example.render() for example in self.examples])
-        return f"""
-        You are an expert in SQL, SQLite databases, and data analysis.
-        You work as a Data Analyst in an **E-commerce Analytics Team**.
-
-        ### **Your Role**
-            Your job is to generate **accurate, optimized, and executable SQL queries** 
-            to answer user questions based on the provided database schema.
-
-        ### **SQL Query Guidelines**
-            - Return only **the exact output format** as expected in the question.
-            - **Do not include extra columns** unless explicitly asked.
-            - For **percentage calculations**, round results to **2 decimal places**.
-            - For **string outputs**, return only the requested value (no extra info).
-            - For **counts/sums**, ensure correct aggregation and filtering.
-            - **Use only tables and columns defined in the schema.**
-            - **Do NOT assume relationships unless explicitly defined.**
-            - **If a table/column does not exist, respond with:** `"SQL query cannot be written for this."`
-            - **Ensure queries are compatible with SQLite (no unsupported functions).**
-            - **Avoid `SELECT *`, select only necessary columns when required.**
-            - **Use joins and filtering effectively for performance.**
-            - When calculating the percentage of a condition (e.g. % of 5-star reviews), use:
-                (COUNT(CASE WHEN condition THEN 1 END) * 100.0 / COUNT(*))
-            - Apply filters like `HAVING COUNT(*) > 100` to ensure statistical significance.
-            - Return only the column(s) specified in the expected output format.
-            - If the question says "[integer: installment count]", only include that field.
-            - Do NOT include helper metrics like COUNT, unless explicitly requested.
-            - When comparing group-level averages (e.g. average freight per city), use:
-                - GROUP BY
-                - HAVING COUNT(...) to filter out low-volume entries
-            - **Use nested queries for advanced aggregation.**
-            - **Do not generate queries that modify data** (`DELETE`, `UPDATE`, `DROP` are prohibited).
-
-        ### **Expected Response Format**
-            - **Return only the SQL query as raw text without Markdown formatting**.
-            - The query should be **fully executable** in SQLite.
-
-        ### Database schema is attached below. Note the relationships between invoices, customers and services.
-            ```mermaid
-            {self.db_schema}
-            ```
-        ### **Product Category Translation**
-            If there are product category translations in {portugese_category_translation},
-            then use the exact Portuguese name in the SQL query.
-        ---
-        ### **Here are some examples**: 
-            {few_shot_examples}
-        """
+    content = (_static_system_prompt(db_schema) + _USER_TEMPLATE
+               + (_TRANSLATION_TEMPLATE if category_translation else ""))
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()[:12]
 
-class UserPrompt(BasePrompt):
+def check_prompt_cacheable(prompt: str) -> bool:
     """
-    Represents the user question and expected output.
+    Checks that the prompt is long enough for OpenAI's automatic prompt caching,
+    and logs a warning if it is not.
 
-    Attributes
+    Parameters
     ----------
-    query : str
-        The user question to be answered.
-    return_type : str
-        The expected output type (e.g., column name and type).
-    query_text : str
-        The SQL query text.
+    prompt : str
+        The static prompt prefix.
 
-    Methods
+    Returns
     -------
-    to_prompt() -> str
-        Returns the user prompt as a Markdown string.
+    bool
+        True if the prompt has at least `MIN_CACHEABLE_PROMPT_TOKENS` tokens.
     """
-    def to_prompt(self, portugese_category_translation: Optional[str]=None) -> str:
-        """
-        Returns the user prompt as a Markdown string.
-        """
-        return f"""
+    token_count = len(tiktoken.encoding_for_model(MODEL).encode(prompt))
+    if token_count < MIN_CACHEABLE_PROMPT_TOKENS:
+        logger.warning("Static prompt has %s tokens, below the %s needed for prompt caching",
+                       token_count, MIN_CACHEABLE_PROMPT_TOKENS)
+        return False
+    logger.info("Static prompt has %s tokens", token_count)
+    return True
+
+_USER_TEMPLATE = """
             ## Generate a SQL query to answer the following question:
             ### **User Question**
-                "{self.query}"
+                "{query}"{translation}
             ### **Expected Output**
                 - **Do NOT include Markdown formatting, code block, backticks, or explanations** in the response.
             """
 
+_TRANSLATION_TEMPLATE = """
+            ### **Product Category Translation**
+                {category_translation}"""
+
+def _render_user_prompt(query: str, category_translation: Optional[str]) -> str:
+    translation = ""
+    if category_translation:
+        translation = _TRANSLATION_TEMPLATE.format(category_translation=category_translation)
+    return _USER_TEMPLATE.format(query=query, translation=translation)
+
+def build_system_message(db_schema: str) -> dict:
+    """
+    Returns the system message for the SQL query generation task.
+    It holds only static content (role, guidelines, schema and the few-shot
+    examples in `RENDERED_FEW_SHOTS`), anything question specific goes into
+    the user message.
+    """
+    return {"role": "system", "content": _static_system_prompt(db_schema)}
+
+def build_user_message(query: str, category_translation: Optional[str] = None) -> dict:
+    """
+    Returns the user message for the SQL query generation task: the question
+    and, if given, the Portuguese names of the product categories it mentions.
+    """
+    return {"role": "user", "content": _render_user_prompt(query, category_translation)}
+
 class DefineFewShotExamples():
     """
     This class defines a set of few-shot examples for SQL query generation.
@@ -121,15 +170,18 @@ class DefineFewShotExamples():
 
     Methods
     -------
-    get_few_shot_prompts() -> List[FewShotExample]
-        Returns a list of few-shot examples for SQL query generation.
+    get_few_shot_prompts() -> Tuple[FewShotExample, ...]
+        Returns the few-shot examples for SQL query generation.
     """
-    def get_few_shot_prompts(self) -> List[FewShotExample]:
+    @staticmethod
+    @functools.lru_cache(maxsize=1)
+    def get_few_shot_prompts() -> Tuple[FewShotExample, ...]:
         """
-        Returns a list of few-shot examples for SQL query generation.
+        Returns the few-shot examples for SQL query generation.
         Each example consists of an input question and the expected SQL output.
+        The examples are built once and shared between calls.
         """
-        return [
+        return (
             FewShotExample(
                 input="How many customers have placed orders worth more than $5000 in total?",
                 output="""```sql
@@ -197,4 +249,8 @@ class DefineFewShotExamples():
                 ORDER BY (COUNT(CASE WHEN r.review_score = 5 THEN 1 END) * 100.0 / COUNT(*)) DESC     
                 LIMIT 1;```"""
             ),
-        ]
+        )
+
+FEW_SHOTS = tuple(sorted(DefineFewShotExamples.get_few_shot_prompts(), key=lambda example: example.input))
+
+RENDERED_FEW_SHOTS = "\n".join(example.rendered for example in FEW_SHOTS)
@@ -1,17 +1,89 @@
 """
 This module provides a client for interacting with the Azure OpenAI API.
 """
+import hashlib
+import logging
+import functools
+from typing import Optional
+import httpx
 import openai
-from openai import AzureOpenAI
-from utils.config import OPENAI_API_KEY, MODEL, setup_logger, azure_endpoint, azure_openai_api_version
-from reasoning.response_fromatter import SQLGenerator, QueryProcessor, FeedbackGenerator
+from openai import AsyncAzureOpenAI
+from tenacity import (retry, retry_if_exception_type, stop_after_attempt, wait_exponential,
+                      before_sleep_log)
+from utils.config import (OPENAI_API_KEY, MODEL, EMBEDDING_MODEL, VERIFIER_MODEL, HTTP_MAX_CONNECTIONS,
+                          HTTP_MAX_KEEPALIVE_CONNECTIONS, SQL_TEMPERATURE,
+                          SQL_MAX_TOKENS, API_MAX_ATTEMPTS, API_RETRY_MAX_WAIT, setup_logger,
+                          azure_endpoint, azure_openai_api_version)
+from utils.response_cache import ResponseCache, make_request_key
+from utils.category_matcher import CategoryMatcher
+from prompts.base import canonicalize
+from reasoning.response_fromatter import (SQLGenerator, QueryProcessor, QueryProcessorBatch,
+                                          FeedbackGenerator, IntentMatch)
 
 logger = setup_logger(__name__)
 
+@functools.lru_cache(maxsize=8)
+def _prompt_cache_key(system_prompt: str) -> str:
+    """
+    Derives a stable `prompt_cache_key` from the static system prompt, so that
+    requests sharing the prefix are routed to the same backend and reuse its cache.
+    """
+    return hashlib.sha1(system_prompt.encode("utf-8")).hexdigest()[:32]
+
+# Retries a request on transient errors; anything else, or the last failure, is raised.
+retry_transient = retry(
+    retry=retry_if_exception_type((openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError)),
+    wait=wait_exponential(min=1, max=API_RETRY_MAX_WAIT),
+    stop=stop_after_attempt(API_MAX_ATTEMPTS),
+    before_sleep=before_sleep_log(logger, logging.WARNING),
+    reraise=True,
+)
+
+class RefusalError(openai.OpenAIError):
+    """
+    Raised when the model refuses to answer a structured output request.
+    """
+
+def _parsed(response):
+    message = response.choices[0].message
+    if message.refusal:
+        raise RefusalError(message.refusal)
+    return message.parsed
+
+_TRANSLATION_SYSTEM_TEMPLATE = canonicalize('''
+    You are an assistant that maps English Product category names
+    to exact Portuguese database category names.
+    Database categories, one "English -> Portuguese" pair per line:
+    {categories}
+    For each English category name, provide the exact Portuguese
+    name and explain why.
+    Respond with "This query does not contain any product categories to expand."
+    if there are no product categories in the query.
+''')
+
+_TRANSLATION_USER_TEMPLATE = canonicalize('''
+    Identify the product categories in the query and
+    expand them to their exact Portuguese names.
+
+    Query: {query}
+''')
+
+_TRANSLATION_BATCH_USER_TEMPLATE = canonicalize('''
+    Identify the product categories in each of the numbered queries below and
+    expand them to their exact Portuguese names.
+    Return exactly one item per query, in the same order, with `query` set to the query text.
+
+    Queries:
+    {queries}
+''')
+
 class OpenAIClient:
     """
     OpenAIClient is a class that interacts with the Azure OpenAI API to generate SQL queries.
-    It uses the AzureOpenAI library to send requests and receive responses from the API.
+    It uses the AsyncAzureOpenAI library to send requests and receive responses from the API,
+    so independent requests can be awaited concurrently. Each instance owns a keep-alive
+    connection pool, so create one client and reuse it across requests.
+    Requests failing with a transient error are retried with exponential backoff.
 
     Attributes
     ----------
@@ -19,29 +91,52 @@ class OpenAIClient:
         The API key for authenticating with the OpenAI API.
     model : str
         The model to use for generating SQL queries.
-    client : AzureOpenAI
-        An instance of the AzureOpenAI class for making API requests.
+    client : AsyncAzureOpenAI
+        An instance of the AsyncAzureOpenAI class for making API requests.
     azure_endpoint : str
         The endpoint for the Azure OpenAI API.
     azure_openai_api_version : str
         The API version for the Azure OpenAI API.
+    cache : ResponseCache, optional
+        Exact-match cache for SQL generation and category translation requests.
+        Identical requests (model, temperature and messages) are served from it.
 
     Methods
     -------
-    get_response(messages, temperature=0.7)
+    get_response(messages, temperature=SQL_TEMPERATURE)
         Sends a request to the OpenAI API with the provided messages and temperature.
+    warm_prompt_cache(system_prompt)
+        Sends a minimal request so the provider caches the static system prompt.
+    get_embedding(text)
+        Returns the embedding vector for the text.
+    is_same_intent(question, cached_question)
+        Checks whether two questions are answered by the same SQL query.
+    expand_and_translate_categories(query, product_categories, temperature=0.3)
+        Translates the product categories mentioned in a query.
+    expand_batch(queries, product_categories, temperature=0.3)
+        Translates the product categories mentioned in several queries with one request.
     """
-    def __init__(self):
+    def __init__(self, cache: Optional[ResponseCache] = None):
         self.openai_api_key = OPENAI_API_KEY
         self.model = MODEL
-        self.client = AzureOpenAI(
+        self.cache = cache
+        self._categories = None
+        self._translation_system_prompt = None
+        self.client = AsyncAzureOpenAI(
             azure_endpoint=azure_endpoint,
             api_key=OPENAI_API_KEY,
-            api_version=azure_openai_api_version
+            api_version=azure_openai_api_version,
+            # Retries are handled by `retry_transient`, with a longer backoff.
+            max_retries=0,
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS,
+                                    max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS)
+            )
         )
 
 
-    def get_feedback(self, user_query, sql_query, temperature=0):
+    @retry_transient
+    async def get_feedback(self, user_query, sql_query, temperature=0):
         '''
         Generates feedback for the SQL query based on the user query.
         Parameters
@@ -73,16 +168,102 @@ class OpenAIClient:
             user question: {user_query}
             This is the SQL query generated:{sql_query}'''}
         ]
-        response = self.client.beta.chat.completions.parse(
-            model=self.model,
-            messages=messages,
-            temperature=temperature,
-            response_format=FeedbackGenerator
-        )
-        return response.choices[0].message.parsed
+        return await self._parse(FeedbackGenerator, model=self.model, messages=messages,
+                                 temperature=temperature)
+
+
+    @retry_transient
+    async def warm_prompt_cache(self, system_prompt):
+        """
+        Sends a minimal request carrying the static system prompt, so the provider
+        populates its prompt cache before the first real question arrives and later
+        requests are only charged for the uncached tail.
+        The request uses the same response format as `get_response`, because the
+        provider places the output schema in the cached prefix.
+
+        Parameters
+        ----------
+        system_prompt : str
+            The static system prompt shared by all SQL generation requests.
+
+        Returns
+        -------
+        int
+            The number of prompt tokens the provider reported as cached.
+        """
+        try:
+            response = await self.client.beta.chat.completions.parse(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": "PING"}
+                ],
+                max_tokens=1,
+                response_format=SQLGenerator,
+                extra_body={"prompt_cache_key": _prompt_cache_key(system_prompt)}
+            )
+        except openai.LengthFinishReasonError as e:
+            # Expected: a single token cannot hold the JSON answer, only the usage is needed.
+            response = e.completion
+        details = response.usage.prompt_tokens_details
+        cached_tokens = details.cached_tokens if details else 0
+        logger.info("Prompt cache warm-up: %s prompt tokens, %s cached",
+                    response.usage.prompt_tokens, cached_tokens)
+        return cached_tokens
+
+    @retry_transient
+    async def get_embedding(self, text):
+        """
+        Returns the embedding vector for the text.
+
+        Parameters
+        ----------
+        text : str
+            The text to embed.
+
+        Returns
+        -------
+        list
+            The embedding vector.
+        """
+        response = await self.client.embeddings.create(model=EMBEDDING_MODEL, input=text)
+        return response.data[0].embedding
+
+    @retry_transient
+    async def is_same_intent(self, question, cached_question):
+        """
+        Checks whether two questions are answered by the same SQL query.
+        Uses a small model, as this only guards semantic cache hits.
 
+        Parameters
+        ----------
+        question : str
+            The user's question in natural language.
+        cached_question : str
+            A previously answered question.
+
+        Returns
+        -------
+        bool
+            True if the cached answer can be reused for the question.
+        """
+        messages = [
+            {"role": "system", "content": '''You decide whether two questions about an
+                        e-commerce database ask for exactly the same data, so that the
+                        same SQL query answers both. Differences in filters, values,
+                        aggregations or output columns mean a different intent.'''},
+            {"role": "user", "content": f'''
+            Question A: {question}
+            Question B: {cached_question}'''}
+        ]
+        try:
+            match = await self._parse(IntentMatch, model=VERIFIER_MODEL, messages=messages, temperature=0)
+        except RefusalError:
+            return False
+        return match.same_intent
 
-    def expand_and_translate_categories(self, query, product_categories, temperature=0.3):
+    @retry_transient
+    async def expand_and_translate_categories(self, query, product_categories, temperature=0.3):
         """
         Expands and translates product categories in the SQL query.
         
@@ -98,32 +279,76 @@ class OpenAIClient:
         str
             The expanded and translated SQL query.
         """
-        system_prompt = f'''You are an assistant that maps English Product category names
-                        to exact Portuguese database category names. 
-                        Database categories include: {product_categories} where the key
-                        is the English name and the value is the Portuguese name.
-                        For each English category name, provide the exact Portuguese 
-                        name and explain why.
-                        Respond with "This query does not contain any product categories to expand." 
-                        if there are no product categories in the query.'''
-        user_prompt = f'''Identify the product categories in the query and
-                        expand them to their exact Portuguese names. \n\nQuery: {query}'''
         messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
+            {"role": "system", "content": self._translation_system_prompt_for(product_categories)},
+            {"role": "user", "content": _TRANSLATION_USER_TEMPLATE.format(query=query)}
         ]
-        response = self.client.beta.chat.completions.parse(
-            model=self.model,
-            messages=messages,
-            temperature=temperature,
-            response_format=QueryProcessor
-        )
-        return response.choices[0].message.parsed
+        return await self._parse_cached(messages, temperature, QueryProcessor)
+
+    @retry_transient
+    async def expand_batch(self, queries, product_categories, temperature=0.3):
+        """
+        Expands and translates product categories in several queries with a single
+        request, so the category list is sent once instead of once per query.
 
-    def get_response(self, messages, temperature=0.7):
+        Parameters
+        ----------
+        queries : list
+            The user queries to be expanded and translated.
+        product_categories : dict
+            A dictionary of product categories and their translations.
+
+        Returns
+        -------
+        list
+            One `QueryProcessor` per query, in order. If the model does not return
+            exactly one item per query, every entry is None.
+        """
+        # One line per query, so multi-line questions keep the numbering unambiguous.
+        numbered = "\n".join(f"{i}. {' '.join(query.split())}" for i, query in enumerate(queries, 1))
+        messages = [
+            {"role": "system", "content": self._translation_system_prompt_for(product_categories)},
+            {"role": "user", "content": _TRANSLATION_BATCH_USER_TEMPLATE.format(queries=numbered)}
+        ]
+        batch = await self._parse_cached(messages, temperature, QueryProcessorBatch)
+        if len(batch.items) != len(queries):
+            logger.warning("Batch translation returned %s items for %s queries", len(batch.items), len(queries))
+            return [None] * len(queries)
+        return list(batch.items)
+
+    def _translation_system_prompt_for(self, product_categories) -> str:
+        # The categories are static, so their rendering is only redone for a different mapping.
+        if product_categories is not self._categories:
+            self._categories = product_categories
+            self._translation_system_prompt = _TRANSLATION_SYSTEM_TEMPLATE.format(
+                categories=CategoryMatcher.render(dict(sorted(product_categories.items()))))
+        return self._translation_system_prompt
+
+    async def _parse(self, response_format, **kwargs):
+        response = await self.client.beta.chat.completions.parse(response_format=response_format, **kwargs)
+        return _parsed(response)
+
+    async def _parse_cached(self, messages, temperature, response_format):
+        key = make_request_key(self.model, temperature, messages) if self.cache else None
+        cached = self.cache.get(key) if key else None
+        if cached is not None:
+            logger.info("LLM cache hit for %s request", response_format.__name__)
+            return response_format.from_cache(cached)
+        parsed = await self._parse(response_format, model=self.model, messages=messages,
+                                   temperature=temperature)
+        if key:
+            self.cache.set(key, parsed.model_dump_json())
+        return parsed
+
+    @retry_transient
+    async def get_response(self, messages, temperature=SQL_TEMPERATURE):
         """
         Sends a request to the OpenAI API with the provided messages and temperature.
-        
+        Output is capped at SQL_MAX_TOKENS tokens.
+        The first message must be the static system prompt, its hash is sent
+        as `prompt_cache_key` to improve prompt cache hit rates. The number of
+        cached prompt tokens is logged, to verify the cache is hit.
+
         Parameters
         ----------
         messages : list
@@ -134,21 +359,45 @@ class OpenAIClient:
 
         Returns
         -------
-        str
-            The generated SQL query from the OpenAI API response.
+        SQLGenerator
+            The parsed response, with the generated SQL query in `query`.
+
+        Raises
+        ------
+        openai.APIError
+            If the OpenAI API request fails.
+        openai.LengthFinishReasonError
+            If the completion was cut off at SQL_MAX_TOKENS tokens.
+        RefusalError
+            If the model refused to write the query.
         """
+        key = make_request_key(self.model, temperature, messages) if self.cache else None
+        cached = self.cache.get(key) if key else None
+        if cached is not None:
+            logger.info("LLM cache hit for SQL generation request")
+            return SQLGenerator.from_cache(cached)
         try:
-            logger.info("Sending request to OpenAI API with messages: %s", messages)
-            response = self.client.beta.chat.completions.parse(
+            logger.info("Sending request to OpenAI API: %s messages", len(messages))
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Request messages digest %s",
+                             hashlib.md5(str(messages).encode("utf-8")).hexdigest()[:8])
+            response = await self.client.beta.chat.completions.parse(
                 model=self.model,
                 messages=messages,
                 temperature=temperature,
-                response_format=SQLGenerator
+                top_p=1,
+                max_tokens=SQL_MAX_TOKENS,
+                response_format=SQLGenerator,
+                extra_body={"prompt_cache_key": _prompt_cache_key(messages[0]["content"])}
             )
-            sql_query = response.choices[0].message.content.strip()
-            # if not sql_query.lower().startswith(("select", "with")):
-            #     return "Only SELECT queries are allowed."
+            if response.usage:
+                details = response.usage.prompt_tokens_details
+                logger.info("SQL generation: %s prompt tokens, %s cached", response.usage.prompt_tokens,
+                            details.cached_tokens if details else 0)
+            sql_query = _parsed(response)
+            if key:
+                self.cache.set(key, sql_query.model_dump_json())
             return sql_query
         except openai.APIError as e:
-            logger.error(f"OpenAI API returned an API Error: {e}")
-            return f"OpenAI API error : {e}"
+            logger.error("OpenAI API returned an API Error: %s", e)
+            raise
@@ -2,38 +2,44 @@
 This module contains the SQLGeneration class, which is used to format the response 
 from the SQL generation process.
 """
+import json
 from typing import List
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
-class Step(BaseModel):
+class ResponseModel(BaseModel):
     """
-    Represents a step in the SQL query generation process.
+    Base class for structured responses. Responses are immutable once parsed.
 
-    Attributes
-    ----------
-    explanation : str
-        A string explaining the reasoning behind the SQL generation.
-    output : str
-        The SQL query generated at this step.
+    Methods
+    -------
+    from_cache(raw) -> ResponseModel
+        Rebuilds a response from JSON written by `model_dump_json`, without validation.
     """
-    explanation: str = Field(description="The reasoning behind the SQL generation.")
-    output: str = Field(description="The SQL query generated at this step.")
+    model_config = ConfigDict(frozen=True)
 
-class SQLGenerator(BaseModel):
+    @classmethod
+    def from_cache(cls, raw: str):
+        """
+        Rebuilds a response from JSON written by `model_dump_json`.
+        The JSON was validated when the response was first parsed,
+        so it is not validated again.
+        """
+        return cls.model_construct(**json.loads(raw))
+
+class SQLGenerator(ResponseModel):
     """
     Represents the SQL query generation task.
 
     Attributes
     ----------
-    steps : List[Step]
-        A list of Step objects representing the reasoning and output at each step.
     query : str
         The final SQL query generated.
     """
-    steps: List[Step] = Field(description="Short reasoning steps explaining the approach")
+    # Only the query is requested: nothing downstream uses intermediate
+    # reasoning, and every generated token adds decode latency.
     query: str = Field(description="The final SQL query generated (PostgreSQL syntax)")
 
-class QueryProcessor(BaseModel):
+class QueryProcessor(ResponseModel):
     """
     Represents a query expansion for the SQL query generation task.
 
@@ -55,7 +61,23 @@ class QueryProcessor(BaseModel):
     expanded_query: str  = Field(description="Expanded category terms in Portuguese")
     explanation: str = Field(description="Explanation for the query expansion.")
 
-class FeedbackGenerator(BaseModel):
+class QueryProcessorBatch(ResponseModel):
+    """
+    Represents the query expansions for several queries, translated in one request.
+
+    Attributes
+    ----------
+    items : List[QueryProcessor]
+        One query expansion per input query, in input order.
+    """
+    items: List[QueryProcessor] = Field(description="One expansion per query, in the order of the queries.")
+
+    @classmethod
+    def from_cache(cls, raw: str):
+        data = json.loads(raw)
+        return cls.model_construct(items=[QueryProcessor.model_construct(**item) for item in data["items"]])
+
+class FeedbackGenerator(ResponseModel):
     """
     Represents the feedback generation for the SQL query generation task.
 
@@ -73,3 +95,14 @@ class FeedbackGenerator(BaseModel):
     """
     score: int = Field(description="Score for the feedback (0-10). The metrics for the score are: correctness / accuracy, completeness, and clarity.")
     feedback: str = Field(description="Feedback from the model on the generated SQL query. The feedback should be in the form of a list of points and should highlight how the score can be improved i.e by ensuring correctness , clarity and completeness.")
+
+class IntentMatch(ResponseModel):
+    """
+    Represents the verdict on whether two questions ask for the same data.
+
+    Attributes
+    ----------
+    same_intent : bool
+        True if both questions are answered by the same SQL query.
+    """
+    same_intent: bool = Field(description="True if both questions are answered by the same SQL query.")
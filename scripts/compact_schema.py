@@ -0,0 +1,110 @@
+'''
+This script converts the Mermaid ER diagram schema into compact SQL DDL.
+The DDL carries the same tables, columns and relationships in fewer
+prompt tokens. Run it from the repository root whenever db/schema.txt changes:
+
+    python -m scripts.compact_schema
+'''
+import re
+from typing import Dict, List, Optional, Tuple
+from utils.config import MERMAID_SCHEMA_PATH, SCHEMA_PATH
+
+TYPE_MAP = {
+    "string": "TEXT",
+    "int": "INTEGER",
+    "float": "REAL",
+    "datetime": "DATETIME",
+}
+
+RELATION_PATTERN = re.compile(r"^(\w+)\s+([|}o][|o])--([|o][|{o])\s+(\w+)\s*:\s*(\w+)$")
+ENTITY_PATTERN = re.compile(r"^(\w+)\s*\{$")
+
+def parse_mermaid(text: str) -> Tuple[Dict[str, List[Tuple[str, str]]], List[Tuple[str, str, str]]]:
+    """
+    Parses a Mermaid erDiagram.
+
+    Parameters
+    ----------
+        text (str): The Mermaid ER diagram.
+
+    Returns
+    -------
+        tuple: A dict of table name to (column type, column name) pairs, and a list of
+        (child table, parent table, label) relationships, where the child holds the
+        foreign key.
+    """
+    tables, relations = {}, []
+    current = None
+    for line in (line.strip() for line in text.splitlines()):
+        if not line or line == "erDiagram":
+            continue
+        if current is not None:
+            if line == "}":
+                current = None
+            else:
+                col_type, col_name = line.split()[:2]
+                tables[current].append((col_type, col_name))
+            continue
+        entity = ENTITY_PATTERN.match(line)
+        if entity:
+            current = entity.group(1)
+            tables[current] = []
+            continue
+        relation = RELATION_PATTERN.match(line)
+        if relation:
+            left, left_card, right_card, right, label = relation.groups()
+            # The "many" side of a one-to-many relationship holds the foreign key.
+            if left_card.startswith("}") and not right_card.endswith("{"):
+                relations.append((left, right, label))
+            else:
+                relations.append((right, left, label))
+    return tables, relations
+
+def _join_columns(child_cols: List[str], parent_cols: List[str]) -> Tuple[Optional[str], Optional[str]]:
+    shared = [col for col in child_cols if col in parent_cols]
+    if shared:
+        return shared[0], shared[0]
+    # Columns such as seller_zip_code_prefix / geolocation_zip_code_prefix only share a suffix.
+    for child_col in child_cols:
+        for parent_col in parent_cols:
+            if child_col.split("_", 1)[-1] == parent_col.split("_", 1)[-1]:
+                return child_col, parent_col
+    return None, None
+
+def to_ddl(tables, relations) -> str:
+    """
+    Renders parsed tables and relationships as compact SQL DDL.
+
+    Returns
+    -------
+        str: One `CREATE TABLE` statement per table, each followed by
+        `-- FK:` comments for its foreign keys.
+    """
+    lines = []
+    for table, columns in tables.items():
+        column_defs = ", ".join(f"{name} {TYPE_MAP.get(col_type, col_type.upper())}"
+                                for col_type, name in columns)
+        lines.append(f"CREATE TABLE {table} ({column_defs});")
+        for child, parent, label in relations:
+            if child != table:
+                continue
+            child_col, parent_col = _join_columns([name for _, name in columns],
+                                                  [name for _, name in tables.get(parent, [])])
+            if child_col:
+                lines.append(f"-- FK: {child}.{child_col} -> {parent}.{parent_col} ({label})")
+            else:
+                lines.append(f"-- FK: {child} -> {parent} ({label})")
+    return "\n".join(lines) + "\n"
+
+def main():
+    """
+    Converts the Mermaid schema file into the compact DDL schema file.
+    """
+    with open(MERMAID_SCHEMA_PATH, 'r', encoding='utf-8') as file:
+        tables, relations = parse_mermaid(file.read())
+    with open(SCHEMA_PATH, 'w', encoding='utf-8') as file:
+        file.write(to_ddl(tables, relations))
+    print(f"Wrote {len(tables)} tables to {SCHEMA_PATH}")
+
+if __name__ == "__main__":
+    main()
@@ -1,56 +1,166 @@
 '''
 Unit test for SQLQueryGenerator
 '''
+import os
+import csv
+import json
+import time
+import asyncio
 import unittest
 import sqlite3
-import matplotlib.pyplot as plt
-from reasoning.openai_client import OpenAIClient
-from main import main
+import numpy as np
+import openai
+from main import get_client, main_batch, run
+from reasoning.openai_client import retry_transient
 from utils.config import DB_PATH, SCHEMA_PATH, setup_logger
 from utils.schema_loader import SchemaLoader
 
 logger = setup_logger(__name__)
 
+EVALUATION_MODEL = "gpt-4o"
+# Grading requests go through the Batch API, which may take a while to complete.
+BATCH_POLL_INTERVAL = 30  # seconds
+# A batch still running after this long is cancelled, and the report is left empty.
+BATCH_TIMEOUT = 2 * 60 * 60  # seconds
+BATCH_FINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+# Questions under test, keyed by test name. They are all generated up front,
+# concurrently, in `setUpClass`.
+QUESTIONS = {
+    "test_query_1_most_orders": '''Which seller has delivered the most orders to customers
+                    in Rio de Janeiro? [string: seller_id]''',
+    "test_query_2_avg_score": '''What's the average review score for
+                    products in the 'beleza_saude' category? [float: score]''',
+    "test_query_3_orders_gt_100k": '''How many sellers have completed orders worth more than
+                    100,000 BRL in total? [integer: count]''',
+    "test_query_4_category_with_max_5star_reviews": '''Which product category has the highest
+                    rate of 5-star reviews? [string: category_name]''',
+    "test_query_5_common_installment_count": '''What's the most common payment installment
+                    count for orders over 1000 BRL? [integer: installments]''',
+    "test_query_6_max_avg_freight_value": '''Which city has the highest average freight
+                    value per order? [string: city_name]''',
+    "test_query_7_expensive_product_category": '''What's the most expensive product category
+                    based on average price? [string: category_name]''',
+    "test_query_8_shortest_avg_delivery_time": '''Which product category has the shortest
+                    average delivery time? [string: category_name]''',
+    "test_query_9_num_orders_from_mul_sellers": '''How many orders have items from
+                     multiple sellers? [integer: count]''',
+    "test_query_10_percentage_orders_delivered_before_est_time": '''What percentage of orders are delivered
+                    before the estimated delivery date? [float: percentage]''',
+}
+
+async def run_evaluation_batch(client, requests):
+    '''
+    Runs chat completion requests as a single Azure OpenAI batch job.
+    The shared client does not retry on its own, so every call is wrapped
+    in `retry_transient`.
+
+    Args:
+        client (AsyncAzureOpenAI): The OpenAI client.
+        requests (list): Chat completion request bodies.
+
+    Returns:
+        list: The content of each completion, in the order of `requests`.
+        Requests without a result get an empty string, as do all requests
+        if the batch does not finish within BATCH_TIMEOUT seconds.
+    '''
+    lines = [json.dumps({"custom_id": str(i), "method": "POST", "url": "/chat/completions", "body": body})
+             for i, body in enumerate(requests)]
+    batch_input = await retry_transient(client.files.create)(
+        file=("batch_input.jsonl", "\n".join(lines).encode("utf-8")), purpose="batch")
+    batch = await retry_transient(client.batches.create)(input_file_id=batch_input.id,
+                                                         endpoint="/chat/completions",
+                                                         completion_window="24h")
+    deadline = time.monotonic() + BATCH_TIMEOUT
+    while batch.status not in BATCH_FINAL_STATUSES:
+        if time.monotonic() >= deadline:
+            logger.error("Evaluation batch %s did not finish within %s seconds, cancelling it",
+                         batch.id, BATCH_TIMEOUT)
+            try:
+                await retry_transient(client.batches.cancel)(batch.id)
+            except openai.APIError as e:
+                logger.error("Could not cancel evaluation batch %s: %s", batch.id, e)
+            return [""] * len(requests)
+        await asyncio.sleep(BATCH_POLL_INTERVAL)
+        batch = await retry_transient(client.batches.retrieve)(batch.id)
+    if batch.status != "completed" or not batch.output_file_id:
+        logger.error("Evaluation batch %s ended with status %s", batch.id, batch.status)
+        return [""] * len(requests)
+
+    output = await retry_transient(client.files.content)(batch.output_file_id)
+    contents = {}
+    for line in output.text.splitlines():
+        result = json.loads(line)
+        if result.get("response"):
+            contents[result["custom_id"]] = result["response"]["body"]["choices"][0]["message"]["content"]
+    return [contents.get(str(i), "") for i in range(len(requests))]
+
 class TestSQLGeneration(unittest.TestCase):
     '''
     Unit tests for verifying the correctness of SQL queries
     generated by the SQLQueryGenerator class.
+
+    The database is opened read-only, so verification queries cannot modify it.
     '''
     @classmethod
     def setUpClass(cls):
         '''
         Initializes necessary resources before running tests.
         Sets up the SQLQueryGenerator, database connection, 
-        schema, cursor, and OpenAI API client.
+        schema, cursor, and OpenAI API client, and generates
+        the SQL queries for all test questions concurrently.
         '''
-        cls.connector = sqlite3.connect(DB_PATH)
+        # Read-only: no journal or locks are needed for verification queries.
+        cls.connector = sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True, check_same_thread=False)
+        cls.connector.execute("PRAGMA query_only=ON")
         cls.shehma_loader = SchemaLoader(DB_PATH, SCHEMA_PATH)
         cls.schema = cls.shehma_loader.get_schema()
         cls.cursor = cls.connector.cursor()
-        cls.test_client = OpenAIClient()
+        cls.test_client = get_client()
         cls.evaluation_results = []
+        cls.evaluation_requests = []
+        cls.generated_queries = dict(zip(QUESTIONS.values(), main_batch(list(QUESTIONS.values()))))
 
     @classmethod
     def tearDownClass(cls):
         '''
         Cleans up resources after all tests have run.
-        Closes the database connection and generates a bar plot of SQL query relevance scores.
+        Closes the database connection, grades the generated SQL queries in a single
+        batch job and writes the SQL query relevance scores to a CSV report.
+        With the PLOT environment variable set, also generates a bar plot of the scores.
         '''
         cls.connector.close()
-        scores = [int(score) for score in cls.evaluation_results if score.isdigit()]
+        if cls.evaluation_requests:
+            cls.evaluation_results.extend(run(run_evaluation_batch(cls.test_client.client,
+                                                                   cls.evaluation_requests)))
+        scores = np.fromiter((int(score) for score in cls.evaluation_results
+                              if score and score.strip().isdigit()), dtype=np.int8)
+        # Written even without scores, so a previous run's report is never left behind.
+        test_cases = np.arange(1, scores.size + 1)
+        with open("results/relevancy_scores.csv", "w", newline="", encoding="utf-8") as file:
+            writer = csv.writer(file)
+            writer.writerow(["test_case", "relevancy_score"])
+            writer.writerows(zip(test_cases.tolist(), scores.tolist()))
+
+        if not scores.size or not os.environ.get("PLOT"):
+            return
+        # Imported only when plotting; the Agg backend writes the file without a GUI toolkit.
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
 
         # Plot the scores
-        plt.figure(figsize=(10, 5))
-        plt.bar(range(1, len(scores) + 1), scores, color='skyblue')
+        fig = plt.figure(figsize=(10, 5))
+        plt.bar(test_cases, scores, color='skyblue')
         plt.xlabel('Test Cases')
         plt.ylabel('Relevancy Score')
         plt.title('Relevancy Scores for SQL Queries')
-        plt.xticks(range(1, len(scores) + 1))
+        plt.xticks(test_cases)
         plt.ylim(0, 5)
 
         # Save the plot
-        plt.savefig("results/relevancy_scores.png")
-        plt.show()
+        plt.savefig("results/relevancy_scores.png", dpi=100, bbox_inches='tight')
+        plt.close(fig)
 
     def check_sql_syntax(self, query):
         '''
@@ -117,17 +227,16 @@ class TestSQLGeneration(unittest.TestCase):
 
     def check_relevance_score(self, request: str, query: str, metric_name: str):
         '''
-        Evaluates the relevancy of the generated SQL query using GPT-based evaluation.
+        Queues the GPT-based relevancy evaluation of the generated SQL query.
 
         Args:
             request (str): The natural language request.
             query (str): The generated SQL query.
             metric_name (str): The evaluation metric name.
 
-        Appends the obtained relevance score to `evaluation_results`.
+        Appends the evaluation request to `evaluation_requests`; all requests are
+        sent as one batch job in `tearDownClass`.
         '''
-        evaluation_model = "gpt-4o"
-
         evaluation_prompt_template = """
         You will be given a natural language request and the SQL query generated to answer it. Your task is to rate the SQL query based on one metric.
 
@@ -172,23 +281,20 @@ class TestSQLGeneration(unittest.TestCase):
             query=query,
             metric_name=metric_name,
         )
-        response = self.test_client.client.chat.completions.create(
-            model=evaluation_model,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0,
-            max_tokens=5,
-            top_p=1,
-            frequency_penalty=0,
-            presence_penalty=0,
-        )
-        score = response.choices[0].message.content
-        self.evaluation_results.append(score)
+        self.evaluation_requests.append({
+            "model": EVALUATION_MODEL,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": 0,
+            "max_tokens": 5,
+            "top_p": 1,
+            "frequency_penalty": 0,
+            "presence_penalty": 0,
+        })
 
     def test_query_1_most_orders(self):
         '''Tests which seller has delivered the most orders to customers in Rio de Janeiro.'''
-        question = '''Which seller has delivered the most orders to customers
-                    in Rio de Janeiro? [string: seller_id]'''
-        sql_query = main(question)
+        question = QUESTIONS["test_query_1_most_orders"]
+        sql_query = self.generated_queries[question]
 
         expected_query = '''
             SELECT s.seller_id
@@ -205,10 +311,9 @@ class TestSQLGeneration(unittest.TestCase):
 
     def test_query_2_avg_score(self):
         '''Tests the average review score for products in the "beleza_saude" category.'''
-        question = '''What's the average review score for
-                    products in the 'beleza_saude' category? [float: score]'''
+        question = QUESTIONS["test_query_2_avg_score"]
 
-        sql_query = main(question)
+        sql_query = self.generated_queries[question]
 
         expected_query = '''
             SELECT 
@@ -223,10 +328,9 @@ class TestSQLGeneration(unittest.TestCase):
 
     def test_query_3_orders_gt_100k(self):
         '''Tests the number of sellers with total completed order sales exceeding 100,000 BRL.'''
-        question = '''How many sellers have completed orders worth more than
-                    100,000 BRL in total? [integer: count]'''
+        question = QUESTIONS["test_query_3_orders_gt_100k"]
 
-        sql_query = main(question)
+        sql_query = self.generated_queries[question]
 
         expected_query = '''
             SELECT COUNT(*) as seller_count
@@ -244,10 +348,9 @@ class TestSQLGeneration(unittest.TestCase):
 
     def test_query_4_category_with_max_5star_reviews(self):
         '''Tests which product category has the highest percentage of 5-star reviews.'''
-        question = '''Which product category has the highest
-                    rate of 5-star reviews? [string: category_name]'''
+        question = QUESTIONS["test_query_4_category_with_max_5star_reviews"]
 
-        sql_query = main(question)
+        sql_query = self.generated_queries[question]
 
         expected_query = '''
             SELECT 
@@ -264,10 +367,9 @@ class TestSQLGeneration(unittest.TestCase):
 
     def test_query_5_common_installment_count(self):
         '''Tests the most common payment installment count for orders over 1000 BRL.'''
-        question = '''What's the most common payment installment
-                    count for orders over 1000 BRL? [integer: installments]'''
+        question = QUESTIONS["test_query_5_common_installment_count"]
 
-        sql_query = main(question)
+        sql_query = self.generated_queries[question]
         expected_query = '''
             SELECT 
                 payment_installments
@@ -282,10 +384,9 @@ class TestSQLGeneration(unittest.TestCase):
 
     def test_query_6_max_avg_freight_value(self):
         '''which city has the highest average freight value per order.'''
-        question = '''Which city has the highest average freight
-                    value per order? [string: city_name]'''
+        question = QUESTIONS["test_query_6_max_avg_freight_value"]
 
-        sql_query = main(question)
+        sql_query = self.generated_queries[question]
 
         expected_query = '''
             SELECT 
@@ -302,10 +403,9 @@ class TestSQLGeneration(unittest.TestCase):
 
     def test_query_7_expensive_product_category(self):
         '''Tests which product category has the highest average price.'''
-        question = '''What's the most expensive product category
-                    based on average price? [string: category_name]'''
+        question = QUESTIONS["test_query_7_expensive_product_category"]
 
-        sql_query = main(question)
+        sql_query = self.generated_queries[question]
 
         expected_query = '''
             SELECT 
@@ -322,10 +422,9 @@ class TestSQLGeneration(unittest.TestCase):
 
     def test_query_8_shortest_avg_delivery_time(self):
         '''Tests which product category has the shortest average delivery time.'''
-        question = '''Which product category has the shortest
-                    average delivery time? [string: category_name]'''
+        question = QUESTIONS["test_query_8_shortest_avg_delivery_time"]
 
-        sql_query = main(question)
+        sql_query = self.generated_queries[question]
         expected_query = '''
             SELECT p.product_category_name
             FROM order_items oi
@@ -342,10 +441,9 @@ class TestSQLGeneration(unittest.TestCase):
 
     def test_query_9_num_orders_from_mul_sellers(self):
         '''Tests how many orders contain items from multiple sellers.'''
-        question = '''How many orders have items from
-                     multiple sellers? [integer: count]'''
+        question = QUESTIONS["test_query_9_num_orders_from_mul_sellers"]
 
-        sql_query = main(question)
+        sql_query = self.generated_queries[question]
 
         expected_query = '''
             SELECT COUNT(*) as multi_seller_orders
@@ -360,10 +458,9 @@ class TestSQLGeneration(unittest.TestCase):
 
     def test_query_10_percentage_orders_delivered_before_est_time(self):
         '''Tests the percentage of orders delivered before the estimated delivery date.'''
-        question = '''What percentage of orders are delivered
-                    before the estimated delivery date? [float: percentage]'''
+        question = QUESTIONS["test_query_10_percentage_orders_delivered_before_est_time"]
 
-        sql_query = main(question)
+        sql_query = self.generated_queries[question]
 
         expected_query = '''
             SELECT 
@@ -0,0 +1,35 @@
+'''
+Helpers shared by the unit tests.
+'''
+import os
+import tempfile
+import unittest
+
+def temp_path(test_case, name):
+    '''
+    Returns a path in a temporary directory that is removed after the test.
+
+    Args:
+        test_case (unittest.TestCase): The test using the path.
+        name (str): The file name.
+
+    Returns:
+        str: The path of `name` in the temporary directory.
+    '''
+    directory = tempfile.TemporaryDirectory()
+    test_case.addCleanup(directory.cleanup)
+    return os.path.join(directory.name, name)
+
+class CacheTestCase(unittest.TestCase):
+    '''
+    Base class for the tests of the SQLite backed caches, which are
+    created by `make_cache` on a temporary database file per test.
+    '''
+    cache_class = None
+
+    def setUp(self):
+        self.cache_path = temp_path(self, "cache.sqlite")
+
+    def make_cache(self, prompt_version="v1", **kwargs):
+        '''Returns a `cache_class` instance on the temporary database.'''
+        return self.cache_class(prompt_version, cache_path=self.cache_path, **kwargs)
@@ -0,0 +1,54 @@
+'''
+Unit tests for the local product category matcher.
+'''
+import unittest
+from types import MappingProxyType
+from utils.category_matcher import CategoryMatcher
+
+CATEGORIES = MappingProxyType({
+    "health_beauty": "beleza_saude",
+    "bed_bath_table": "cama_mesa_banho",
+    "home_appliances": "eletrodomesticos",
+    "home_appliances_2": "eletrodomesticos_2",
+})
+
+class TestCategoryMatcher(unittest.TestCase):
+    '''
+    Tests matching of English and Portuguese category names.
+    '''
+    def setUp(self):
+        self.matcher = CategoryMatcher(CATEGORIES)
+
+    def test_matches_english_and_portuguese_names(self):
+        '''Names match regardless of language, case and underscores.'''
+        self.assertEqual(self.matcher.match("Average score for Health Beauty products?"),
+                         {"health_beauty": "beleza_saude"})
+        self.assertEqual(self.matcher.match("Average score in 'beleza_saude'?"),
+                         {"health_beauty": "beleza_saude"})
+        self.assertEqual(self.matcher.match("Orders of BED_BATH_TABLE and beleza saude"),
+                         {"bed_bath_table": "cama_mesa_banho", "health_beauty": "beleza_saude"})
+
+    def test_longest_name_wins(self):
+        '''A name that extends a shorter category name matches the longer category only.'''
+        self.assertEqual(self.matcher.match("Revenue of home appliances 2 last year"),
+                         {"home_appliances_2": "eletrodomesticos_2"})
+        self.assertEqual(self.matcher.match("Revenue of home appliances last year"),
+                         {"home_appliances": "eletrodomesticos"})
+
+    def test_matches_whole_words_only(self):
+        '''Category names inside longer words are not matched.'''
+        self.assertEqual(self.matcher.match("Sellers of home appliances23"), {})
+        self.assertEqual(self.matcher.match("How many orders were delivered?"), {})
+
+    def test_no_categories(self):
+        '''A matcher over no categories never matches.'''
+        self.assertEqual(CategoryMatcher({}).match("health beauty"), {})
+
+    def test_render(self):
+        '''Matches are rendered one "english -> portugese" pair per line.'''
+        matches = {"health_beauty": "beleza_saude", "bed_bath_table": "cama_mesa_banho"}
+        self.assertEqual(CategoryMatcher.render(matches),
+                         "health_beauty -> beleza_saude\nbed_bath_table -> cama_mesa_banho")
+
+if __name__ == "__main__":
+    unittest.main()
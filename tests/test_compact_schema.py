@@ -0,0 +1,76 @@
+'''
+Unit tests for the Mermaid to DDL schema conversion.
+'''
+import unittest
+from scripts.compact_schema import parse_mermaid, to_ddl
+from utils.config import MERMAID_SCHEMA_PATH, SCHEMA_PATH
+
+DIAGRAM = '''
+erDiagram
+    orders ||--o{ order_items : contains
+    orders }|--|| customers : placed_by
+    customers }|--|| geolocation : located_in
+    order_items }|--|| shipments : ships_with
+
+    orders {
+        string order_id
+        string customer_id
+        datetime order_purchase_timestamp
+    }
+
+    order_items {
+        string order_id
+        float price
+    }
+
+    customers {
+        string customer_id
+        string customer_zip_code_prefix
+    }
+
+    geolocation {
+        string geolocation_zip_code_prefix
+        float geolocation_lat
+    }
+
+    shipments {
+        string carrier
+    }
+'''
+
+class TestCompactSchema(unittest.TestCase):
+    '''
+    Tests parsing of the Mermaid ER diagram and foreign key inference.
+    '''
+    def test_parse_mermaid(self):
+        '''Entities become tables, and each relationship points from the "many" side to the "one" side.'''
+        tables, relations = parse_mermaid(DIAGRAM)
+        self.assertEqual(tables["orders"], [("string", "order_id"), ("string", "customer_id"),
+                                            ("datetime", "order_purchase_timestamp")])
+        self.assertEqual(relations, [("order_items", "orders", "contains"),
+                                     ("orders", "customers", "placed_by"),
+                                     ("customers", "geolocation", "located_in"),
+                                     ("order_items", "shipments", "ships_with")])
+
+    def test_to_ddl(self):
+        '''Columns get SQL types, and foreign keys are inferred from shared column names or suffixes.'''
+        ddl = to_ddl(*parse_mermaid(DIAGRAM)).splitlines()
+        self.assertEqual(ddl[0], "CREATE TABLE orders (order_id TEXT, customer_id TEXT, "
+                                 "order_purchase_timestamp DATETIME);")
+        self.assertIn("-- FK: orders.customer_id -> customers.customer_id (placed_by)", ddl)
+        self.assertIn("-- FK: order_items.order_id -> orders.order_id (contains)", ddl)
+        self.assertIn("-- FK: customers.customer_zip_code_prefix -> "
+                      "geolocation.geolocation_zip_code_prefix (located_in)", ddl)
+        # Without a matching column, only the tables are named.
+        self.assertIn("-- FK: order_items -> shipments (ships_with)", ddl)
+        self.assertIn("CREATE TABLE order_items (order_id TEXT, price REAL);", ddl)
+
+    def test_checked_in_schema_is_up_to_date(self):
+        '''The compact schema file matches a fresh conversion of the Mermaid schema.'''
+        with open(MERMAID_SCHEMA_PATH, 'r', encoding='utf-8') as file:
+            expected = to_ddl(*parse_mermaid(file.read()))
+        with open(SCHEMA_PATH, 'r', encoding='utf-8') as file:
+            self.assertEqual(file.read(), expected)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+'''
+Unit tests for the question pipeline in main.py. They run offline, with the OpenAI client mocked.
+'''
+import unittest
+from unittest import mock
+import httpx
+import openai
+import main
+
+class TestSameLiterals(unittest.TestCase):
+    '''
+    Tests the literal check guarding direct semantic cache hits.
+    '''
+    def setUp(self):
+        matcher = mock.Mock()
+        matcher.match.side_effect = lambda question: {"toys": "brinquedos"} if "toys" in question else {}
+        patcher = mock.patch.object(main, "get_category_matcher", return_value=matcher)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_same_literals(self):
+        '''Questions with the same categories, quoted values and numbers, in any order, match.'''
+        self.assertTrue(main.same_literals("top 5 toys sellers in 'sp' for 2018",
+                                           "for 2018, the 5 best toys sellers in 'sp'"))
+        self.assertTrue(main.same_literals("what's the number of orders?", "how many orders are there?"))
+
+    def test_different_literals(self):
+        '''A different category, quoted value or number is not the same question.'''
+        self.assertFalse(main.same_literals("top 5 toys sellers", "top 5 garden sellers"))
+        self.assertFalse(main.same_literals("sellers in 'sp'", "sellers in 'rj'"))
+        self.assertFalse(main.same_literals("top 5 sellers", "top 10 sellers"))
+        self.assertFalse(main.same_literals("orders above 1,500.50", "orders above 1,500"))
+
+class TestGetCategoryMatcher(unittest.TestCase):
+    '''
+    Tests the memoization of the product category matcher.
+    '''
+    def setUp(self):
+        self.loader = mock.Mock()
+        for patcher in (mock.patch.object(main, "_schema_loader", self.loader),
+                        mock.patch.object(main, "_category_matcher", None)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_matcher_without_categories_is_not_kept(self):
+        '''After a failed read, the categories are read again on the next call and then kept.'''
+        self.loader.read_product_categories.side_effect = [{}, {"toys": "brinquedos"}]
+        self.assertEqual(main.get_category_matcher().match("toys"), {})
+        matcher = main.get_category_matcher()
+        self.assertEqual(matcher.match("toys"), {"toys": "brinquedos"})
+        self.assertIs(main.get_category_matcher(), matcher)
+        self.assertEqual(self.loader.read_product_categories.call_count, 2)
+
+class TestTranslateBatch(unittest.IsolatedAsyncioTestCase):
+    '''
+    Tests the batched category translation of `main_batch`.
+    '''
+    def setUp(self):
+        self.client = mock.Mock()
+        self.client.expand_batch = mock.AsyncMock()
+        matcher = mock.Mock()
+        # Questions naming a category verbatim are matched locally.
+        matcher.match.side_effect = lambda question: {"toys": "brinquedos"} if "toys" in question else {}
+        for patcher in (mock.patch.object(main, "ENABLE_CATEGORY_TRANSLATION", True),
+                        mock.patch.object(main, "get_client", return_value=self.client),
+                        mock.patch.object(main, "get_category_matcher", return_value=matcher),
+                        mock.patch.object(main, "_schema_loader"),
+                        mock.patch.object(main, "response_cache")):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        main.response_cache.get.return_value = None
+
+    async def test_results_map_to_the_pending_questions(self):
+        '''Only unmatched questions are translated, and each result goes to its question.'''
+        self.client.expand_batch.return_value = ["first", "second"]
+        questions = ["Orders of toys", "Sales of beauty products", "Revenue of garden tools"]
+        self.assertEqual(await main._translate_batch(questions), [None, "first", "second"])
+        self.assertEqual(self.client.expand_batch.await_args.args[0],
+                         ["sales of beauty products", "revenue of garden tools"])
+
+    async def test_cached_questions_are_not_translated(self):
+        '''Questions answered by the response cache are skipped, as they are never generated.'''
+        cached_key = main.make_cache_key("Revenue of garden tools", main.PROMPT_VERSION)
+        main.response_cache.get.side_effect = lambda key: "SELECT 1;" if key == cached_key else None
+        self.client.expand_batch.return_value = ["first", "second"]
+        questions = ["Sales of beauty products", "Revenue of garden tools", "Sellers of garden tools"]
+        self.assertEqual(await main._translate_batch(questions), ["first", None, "second"])
+
+    async def test_single_pending_question_is_not_batched(self):
+        '''A single pending question is left to its own translation.'''
+        self.assertEqual(await main._translate_batch(["Orders of toys", "Sales of beauty products"]),
+                         [None, None])
+        self.client.expand_batch.assert_not_awaited()
+
+    async def test_item_count_mismatch_falls_back_to_no_translations(self):
+        '''When the batch cannot be matched to the questions, every question is left untranslated.'''
+        self.client.expand_batch.return_value = [None, None]
+        self.assertEqual(await main._translate_batch(["Sales of beauty products", "Revenue of garden tools"]),
+                         [None, None])
+
+    async def test_api_error_falls_back_to_no_translations(self):
+        '''A failed batch request leaves every question untranslated instead of failing the batch.'''
+        self.client.expand_batch.side_effect = openai.APIConnectionError(
+            request=httpx.Request("POST", "https://example.invalid"))
+        self.assertEqual(await main._translate_batch(["Sales of beauty products", "Revenue of garden tools"]),
+                         [None, None])
+
+if __name__ == "__main__":
+    unittest.main()
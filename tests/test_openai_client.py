@@ -0,0 +1,64 @@
+'''
+Unit tests for the OpenAI client. They run offline, with the API client and responses mocked.
+'''
+import unittest
+from unittest import mock
+import openai
+from openai.types import CompletionUsage
+from openai.types.chat import ChatCompletion
+from reasoning.openai_client import OpenAIClient
+from reasoning.response_fromatter import QueryProcessor, QueryProcessorBatch, SQLGenerator
+
+def expansion(query):
+    '''Returns a `QueryProcessor` for the query.'''
+    return QueryProcessor(query=query, expanded_query=f"{query} (pt)", explanation="")
+
+class TestExpandBatch(unittest.IsolatedAsyncioTestCase):
+    '''
+    Tests the batched category translation.
+    '''
+    def setUp(self):
+        patcher = mock.patch("reasoning.openai_client.AsyncAzureOpenAI")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = OpenAIClient()
+        self.client._parse_cached = mock.AsyncMock()
+
+    async def test_returns_one_expansion_per_query(self):
+        '''The expansions are returned in query order, with the category list sent once.'''
+        self.client._parse_cached.return_value = QueryProcessorBatch(
+            items=[expansion("toys"), expansion("health beauty")])
+        results = await self.client.expand_batch(["toys", "health beauty"], {"toys": "brinquedos"})
+        self.assertEqual([result.query for result in results], ["toys", "health beauty"])
+        self.client._parse_cached.assert_awaited_once()
+
+    async def test_item_count_mismatch_returns_none_for_every_query(self):
+        '''When the model returns another number of items, no expansion can be trusted.'''
+        self.client._parse_cached.return_value = QueryProcessorBatch(items=[expansion("toys")])
+        results = await self.client.expand_batch(["toys", "health beauty"], {"toys": "brinquedos"})
+        self.assertEqual(results, [None, None])
+
+class TestWarmPromptCache(unittest.IsolatedAsyncioTestCase):
+    '''
+    Tests the prompt cache warm-up request.
+    '''
+    def setUp(self):
+        patcher = mock.patch("reasoning.openai_client.AsyncAzureOpenAI")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = OpenAIClient()
+
+    async def test_sends_the_sql_response_format(self):
+        '''The warm-up caches the same prefix as SQL generation, and its cut-off answer is not an error.'''
+        completion = ChatCompletion(
+            id="warm-up", choices=[], created=0, model="gpt-4o", object="chat.completion",
+            usage=CompletionUsage(prompt_tokens=1500, completion_tokens=1, total_tokens=1501,
+                                  prompt_tokens_details={"cached_tokens": 1280}))
+        parse = self.client.client.beta.chat.completions.parse = mock.AsyncMock(
+            side_effect=openai.LengthFinishReasonError(completion=completion))
+        self.assertEqual(await self.client.warm_prompt_cache("system prompt"), 1280)
+        self.assertIs(parse.await_args.kwargs["response_format"], SQLGenerator)
+        self.assertEqual(parse.await_args.kwargs["max_tokens"], 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,19 @@
+'''
+Unit tests for the SQL generation prompt.
+'''
+import unittest
+from prompts.prompt import prompt_version
+
+class TestPromptVersion(unittest.TestCase):
+    '''
+    Tests what the prompt version depends on.
+    '''
+    def test_depends_on_schema_and_category_translation(self):
+        '''A changed schema or a toggled category translation gives another version.'''
+        version = prompt_version("CREATE TABLE orders (order_id TEXT);", category_translation=True)
+        self.assertEqual(version, prompt_version("CREATE TABLE orders (order_id TEXT);", True))
+        self.assertNotEqual(version, prompt_version("CREATE TABLE orders (order_id TEXT);", False))
+        self.assertNotEqual(version, prompt_version("CREATE TABLE sellers (seller_id TEXT);", True))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,145 @@
+'''
+Unit tests for the response cache. They run offline, against a temporary SQLite file.
+'''
+import asyncio
+import unittest
+from utils.response_cache import (ResponseCache, cached_response, make_cache_key, make_request_key,
+                                  normalize_question)
+from tests.support import CacheTestCase, temp_path
+
+class TestCacheKeys(unittest.TestCase):
+    '''
+    Tests the cache key helpers.
+    '''
+    def test_normalized_spellings_share_a_key(self):
+        '''Questions differing only in case and whitespace share a cache key.'''
+        self.assertEqual(normalize_question("  How many   CUSTOMERS?\n"), "how many customers?")
+        self.assertEqual(make_cache_key("How many customers?", "v1"),
+                         make_cache_key(" how many  customers? ", "v1"))
+
+    def test_prompt_version_is_part_of_the_key(self):
+        '''The same question gets a different key for another prompt version.'''
+        self.assertNotEqual(make_cache_key("How many customers?", "v1"),
+                            make_cache_key("How many customers?", "v2"))
+
+    def test_request_key_depends_on_every_field(self):
+        '''Request keys ignore dict key order but not the model, temperature or messages.'''
+        messages = [{"role": "user", "content": "hi"}]
+        key = make_request_key("gpt-4o", 0, messages)
+        self.assertEqual(key, make_request_key("gpt-4o", 0, [{"content": "hi", "role": "user"}]))
+        self.assertNotEqual(key, make_request_key("gpt-4o-mini", 0, messages))
+        self.assertNotEqual(key, make_request_key("gpt-4o", 0.3, messages))
+        self.assertNotEqual(key, make_request_key("gpt-4o", 0, [{"role": "user", "content": "hello"}]))
+
+class TestResponseCache(CacheTestCase):
+    '''
+    Tests expiry, prompt versioning, the in-memory LRU and purging.
+    '''
+    cache_class = ResponseCache
+
+    def test_returns_stored_sql(self):
+        '''A stored query is served by the same and by a new instance.'''
+        self.make_cache().set("key", "SELECT 1;")
+        self.assertEqual(self.make_cache().get("key"), "SELECT 1;")
+        self.assertIsNone(self.make_cache().get("other"))
+
+    def test_expired_entries_are_not_served(self):
+        '''Entries past their TTL are served neither from memory nor from SQLite.'''
+        cache = self.make_cache(ttl=-1)
+        cache.set("key", "SELECT 1;")
+        self.assertIsNone(cache.get("key"))
+        self.assertIsNone(self.make_cache().get("key"))
+
+    def test_other_prompt_versions_are_not_served(self):
+        '''Entries are only served for the prompt version they were stored with.'''
+        self.make_cache("v1").set("key", "SELECT 1;")
+        self.assertIsNone(self.make_cache("v2").get("key"))
+
+    def test_tables_are_separate(self):
+        '''Caches sharing the database file do not see each other's entries.'''
+        self.make_cache().set("key", "SELECT 1;")
+        self.assertIsNone(self.make_cache(table="llm_cache").get("key"))
+
+    def test_memory_evicts_least_recently_used(self):
+        '''Only the `memory_size` most recently used entries are kept in memory.'''
+        cache = self.make_cache(memory_size=2)
+        cache.set("a", "SELECT 'a';")
+        cache.set("b", "SELECT 'b';")
+        cache.get("a")
+        cache.set("c", "SELECT 'c';")
+        # With the rows gone from SQLite, only entries still held in memory are served.
+        with cache._connect() as conn:
+            conn.execute("DELETE FROM cache")
+        self.assertEqual(cache.get("a"), "SELECT 'a';")
+        self.assertEqual(cache.get("c"), "SELECT 'c';")
+        self.assertIsNone(cache.get("b"))
+
+    def test_purge_removes_stale_entries(self):
+        '''Purging removes entries of other prompt versions, expired and too old entries.'''
+        self.make_cache("v1").set("old_version", "SELECT 1;")
+        self.make_cache("v2", ttl=-1).set("expired", "SELECT 2;")
+        self.make_cache("v2").set("fresh", "SELECT 3;")
+        cache = self.make_cache("v2")
+        self.assertEqual(cache.purge(), 2)
+        self.assertEqual(cache.get("fresh"), "SELECT 3;")
+        self.assertEqual(cache.purge(max_age=0), 1)
+        self.assertIsNone(cache.get("fresh"))
+
+class TestCachedResponse(unittest.IsolatedAsyncioTestCase):
+    '''
+    Tests the `cached_response` decorator.
+    '''
+    def setUp(self):
+        self.cache = ResponseCache("v1", cache_path=temp_path(self, "cache.sqlite"))
+        self.calls = []
+        self.release = asyncio.Event()
+
+        @cached_response("v1", self.cache)
+        async def generate(question, suffix=""):
+            self.calls.append(question)
+            await self.release.wait()
+            if question == "fail":
+                raise ValueError("generation failed")
+            return f"SELECT '{question.strip().lower()}'{suffix};"
+        self.generate = generate
+
+    async def test_concurrent_calls_share_one_generation(self):
+        '''Concurrent calls for the same question wait for a single generation.'''
+        tasks = [asyncio.create_task(self.generate(question))
+                 for question in ("Orders", " orders ", "ORDERS")]
+        await asyncio.sleep(0)
+        self.release.set()
+        self.assertEqual(await asyncio.gather(*tasks), ["SELECT 'orders';"] * 3)
+        self.assertEqual(len(self.calls), 1)
+
+    async def test_result_is_cached(self):
+        '''A later call is served from the cache, without generating again.'''
+        self.release.set()
+        self.assertEqual(await self.generate("orders", suffix=" LIMIT 1"), "SELECT 'orders' LIMIT 1;")
+        self.assertEqual(await self.generate("orders"), "SELECT 'orders' LIMIT 1;")
+        self.assertEqual(self.calls, ["orders"])
+
+    async def test_cancelled_caller_does_not_cancel_the_generation(self):
+        '''Cancelling one caller leaves the shared generation running for the others.'''
+        first = asyncio.create_task(self.generate("orders"))
+        second = asyncio.create_task(self.generate("orders"))
+        await asyncio.sleep(0)
+        first.cancel()
+        self.release.set()
+        self.assertEqual(await second, "SELECT 'orders';")
+        with self.assertRaises(asyncio.CancelledError):
+            await first
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(self.cache.get(make_cache_key("orders", "v1")), "SELECT 'orders';")
+
+    async def test_failures_are_not_cached(self):
+        '''A failed generation is raised to every caller and retried on the next call.'''
+        self.release.set()
+        results = await asyncio.gather(self.generate("fail"), self.generate("fail"), return_exceptions=True)
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+        with self.assertRaises(ValueError):
+            await self.generate("fail")
+        self.assertEqual(len(self.calls), 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+'''
+Unit tests for the schema loader. They run offline, against a temporary SQLite file.
+'''
+import os
+import sqlite3
+import unittest
+from types import MappingProxyType
+from utils.schema_loader import SchemaLoader
+from tests.support import temp_path
+
+def create_categories_db(db_path, rows):
+    '''Creates a database with the product category translation table.'''
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE product_category_name_translation ("
+                     "product_category_name TEXT, product_category_name_english TEXT)")
+        conn.executemany("INSERT INTO product_category_name_translation VALUES (?, ?)", rows)
+    conn.close()
+
+class TestSchemaLoader(unittest.TestCase):
+    '''
+    Tests reading of the schema file and of the product categories.
+    '''
+    def setUp(self):
+        self.db_path = temp_path(self, "olist.sqlite")
+        self.loader = SchemaLoader(db_path=self.db_path, schema_path=self.db_path + ".sql")
+        self.addCleanup(self.loader.close)
+
+    def test_reads_categories_once(self):
+        '''Categories map English to Portuguese names and are read from the database once.'''
+        create_categories_db(self.db_path, [("brinquedos", "toys"), ("beleza_saude", "health_beauty")])
+        categories = self.loader.read_product_categories()
+        self.assertEqual(dict(categories), {"toys": "brinquedos", "health_beauty": "beleza_saude"})
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("DELETE FROM product_category_name_translation")
+        conn.close()
+        self.assertIs(self.loader.read_product_categories(), categories)
+
+    def test_close_keeps_the_categories(self):
+        '''Closing the connection keeps the memoized categories, so they are not read again.'''
+        create_categories_db(self.db_path, [("brinquedos", "toys")])
+        categories = self.loader.read_product_categories()
+        self.loader.close()
+        os.remove(self.db_path)
+        self.assertIs(self.loader.read_product_categories(), categories)
+
+    def test_missing_database_has_no_categories(self):
+        '''A missing database yields no categories, is not created, and is read again on the next call.'''
+        categories = self.loader.read_product_categories()
+        self.assertIsInstance(categories, MappingProxyType)
+        self.assertEqual(dict(categories), {})
+        self.assertFalse(os.path.exists(self.db_path))
+        create_categories_db(self.db_path, [("brinquedos", "toys")])
+        self.assertEqual(dict(self.loader.read_product_categories()), {"toys": "brinquedos"})
+
+    def test_missing_schema_file_is_empty(self):
+        '''A missing schema file yields an empty schema.'''
+        self.assertEqual(self.loader.get_schema(), "")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+'''
+Unit tests for the semantic cache. They run offline, with hand-made embeddings.
+'''
+import time
+import unittest
+from unittest import mock
+from utils.semantic_cache import SemanticCache
+from tests.support import CacheTestCase
+
+class TestSemanticCache(CacheTestCase):
+    '''
+    Tests nearest-neighbour lookup, prompt versioning, expiry and purging.
+    '''
+    cache_class = SemanticCache
+
+    def test_empty_cache_has_no_match(self):
+        '''A lookup in an empty cache returns None.'''
+        self.assertIsNone(self.make_cache().lookup([1.0, 0.0]))
+
+    def test_returns_the_most_similar_question(self):
+        '''The closest question is returned with its cosine similarity, also after a reload.'''
+        cache = self.make_cache()
+        cache.insert("orders per city", [1.0, 0.0, 0.0], "SELECT 1;")
+        cache.insert("sellers per city", [0.0, 1.0, 0.0], "SELECT 2;")
+        for lookup_cache in (cache, self.make_cache()):
+            match = lookup_cache.lookup([2.0, 0.2, 0.0])
+            self.assertEqual((match.question, match.sql), ("orders per city", "SELECT 1;"))
+            self.assertAlmostEqual(match.similarity, 2.0 / (2.0 ** 2 + 0.2 ** 2) ** 0.5, places=5)
+
+    def test_other_prompt_versions_are_not_used(self):
+        '''Entries are only matched for the prompt version they were stored with.'''
+        self.make_cache("v1").insert("orders per city", [1.0, 0.0], "SELECT 1;")
+        self.assertIsNone(self.make_cache("v2").lookup([1.0, 0.0]))
+
+    def test_other_embedding_models_are_not_used(self):
+        '''Entries are only matched for the embedding model they were stored with, and purged for others.'''
+        self.make_cache(embedding_model="small").insert("orders per city", [1.0, 0.0], "SELECT 1;")
+        cache = self.make_cache(embedding_model="large")
+        self.assertIsNone(cache.lookup([1.0, 0.0]))
+        self.assertEqual(cache.purge(), 1)
+
+    def test_failures_are_a_miss(self):
+        '''An embedding of another size is a miss, and is not stored, instead of raising.'''
+        cache = self.make_cache()
+        cache.insert("orders per city", [1.0, 0.0], "SELECT 1;")
+        with self.assertLogs("utils.semantic_cache", "WARNING"):
+            self.assertIsNone(cache.lookup([1.0, 0.0, 0.0]))
+            cache.insert("sellers per city", [0.0, 1.0, 0.0], "SELECT 2;")
+        self.assertEqual(cache.lookup([1.0, 0.0]).sql, "SELECT 1;")
+
+    def test_expired_entries_are_not_used(self):
+        '''Entries past their TTL are not loaded.'''
+        self.make_cache(ttl=-1).insert("orders per city", [1.0, 0.0], "SELECT 1;")
+        self.assertIsNone(self.make_cache().lookup([1.0, 0.0]))
+
+    def test_entries_expire_in_memory(self):
+        '''Loaded entries stop matching once their TTL has passed.'''
+        cache = self.make_cache(ttl=60)
+        cache.insert("orders per city", [1.0, 0.0], "SELECT 1;")
+        cache.insert("sellers per city", [0.0, 1.0], "SELECT 2;")
+        with mock.patch("time.time", return_value=time.time() + 61):
+            self.assertIsNone(cache.lookup([1.0, 0.0]))
+
+    def test_insert_replaces_the_entry_of_the_question(self):
+        '''Storing a question again replaces its query, in memory as in SQLite.'''
+        cache = self.make_cache()
+        cache.insert("orders per city", [1.0, 0.0], "SELECT 1;")
+        cache.insert("orders per city", [1.0, 0.0], "SELECT 2;")
+        for lookup_cache in (cache, self.make_cache()):
+            self.assertEqual(lookup_cache.lookup([1.0, 0.0]).sql, "SELECT 2;")
+        self.assertEqual(len(cache._entries), 1)
+
+    def test_purge_removes_stale_entries(self):
+        '''Purging removes entries of other prompt versions, and entries older than `max_age`.'''
+        self.make_cache("v1").insert("orders per city", [1.0, 0.0], "SELECT 1;")
+        cache = self.make_cache("v2")
+        cache.insert("sellers per city", [0.0, 1.0], "SELECT 2;")
+        self.assertEqual(cache.purge(), 1)
+        self.assertEqual(cache.lookup([0.0, 1.0]).sql, "SELECT 2;")
+        self.assertEqual(cache.purge(max_age=0), 1)
+        self.assertIsNone(cache.lookup([0.0, 1.0]))
+
+if __name__ == "__main__":
+    unittest.main()
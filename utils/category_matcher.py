@@ -0,0 +1,63 @@
+'''
+    This class finds product category names mentioned in a user question.
+'''
+import re
+from typing import Dict, Mapping
+
+class CategoryMatcher:
+    '''
+    Matches English and Portuguese product category names in a question
+    with a single precompiled regular expression, so questions that name a
+    known category do not need an LLM call to translate it.
+
+    Attributes
+    ----------
+    categories : Mapping
+        Product categories, key -> english, value -> portugese. Not copied,
+        so pass a mapping that does not change, e.g. from `read_product_categories`.
+
+    Methods
+    -------
+    match(question) -> Dict[str, str]
+        Returns the categories mentioned in the question.
+    '''
+    def __init__(self, categories: Mapping[str, str]):
+        self.categories = categories
+        self._names = {}
+        for english, portugese in self.categories.items():
+            for name in (english, portugese):
+                self._names[self._phrase(name)] = english
+        # Longest names first, so "bed bath table" wins over "table".
+        alternatives = sorted(self._names, key=len, reverse=True)
+        self._pattern = re.compile(
+            r"\b(" + "|".join(re.escape(name) for name in alternatives) + r")\b"
+        ) if alternatives else None
+
+    @staticmethod
+    def _phrase(name: str) -> str:
+        return " ".join(name.lower().replace("_", " ").split())
+
+    def match(self, question: str) -> Dict[str, str]:
+        """
+        Returns the categories mentioned in the question.
+
+        Returns:
+            dict: The matched categories, key -> english, value -> portugese.
+        """
+        if self._pattern is None:
+            return {}
+        matches = {}
+        for name in self._pattern.findall(self._phrase(question)):
+            english = self._names[name]
+            matches[english] = self.categories[english]
+        return matches
+
+    @staticmethod
+    def render(matches: Dict[str, str]) -> str:
+        """
+        Renders matched categories for the prompt.
+
+        Returns:
+            str: One "english -> portugese" line per category.
+        """
+        return "\n".join(f"{english} -> {portugese}" for english, portugese in matches.items())
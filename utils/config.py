@@ -1,10 +1,13 @@
 """
 This module contains the configuration settings for the application.
 It includes the OpenAI API key, Azure OpenAI settings, database path, 
-schema path, and logging configuration.
+schema path, response cache settings, and logging configuration.
 """
 import os
+import queue
+import atexit
 import logging
+import logging.handlers
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -14,21 +17,59 @@ OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 azure_endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
 azure_openai_api_version = os.getenv("AZURE_OPENAI_API_VERSION")
 azure_openai_model = os.getenv("AZURE_OPENAI_DEPLOYMENT")
+EMBEDDING_MODEL = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT", "text-embedding-3-small")
+VERIFIER_MODEL = "gpt-4o-mini"
+
+# Connection pool shared by all requests to the OpenAI API.
+HTTP_MAX_CONNECTIONS = 64
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 32
+# Transient API errors (rate limits, timeouts, connection errors) are retried
+# with exponential backoff, up to API_MAX_ATTEMPTS attempts per request.
+API_MAX_ATTEMPTS = 5
+API_RETRY_MAX_WAIT = 30  # seconds
+# Upper bound on questions or completions processed at once by the batch helpers.
+MAX_CONCURRENT_REQUESTS = 10
 
 DB_PATH = "db/olist.sqlite"
-SCHEMA_PATH = "db/schema.txt"
+MERMAID_SCHEMA_PATH = "db/schema.txt"
+# Compact DDL generated from MERMAID_SCHEMA_PATH by scripts/compact_schema.py.
+SCHEMA_PATH = "db/schema.compact.sql"
+
+# Deterministic, bounded SQL generation: identical questions get identical
+# queries (which keeps the caches effective) and decoding stops early.
+SQL_TEMPERATURE = 0
+SQL_MAX_TOKENS = 512
+
+# Adds the Portuguese names of product categories mentioned in a question to the prompt.
+ENABLE_CATEGORY_TRANSLATION = os.getenv("ENABLE_CATEGORY_TRANSLATION", "1") != "0"
+
+RESPONSE_CACHE_PATH = "db/response_cache.sqlite"
+RESPONSE_CACHE_TTL = 7 * 24 * 60 * 60  # seconds
+# Most recently used entries are also kept in memory, in front of SQLite.
+RESPONSE_CACHE_MEMORY_SIZE = 256
+# Table of the exact-match cache for individual LLM requests, in RESPONSE_CACHE_PATH.
+LLM_CACHE_TABLE = "llm_cache"
+
+# Questions at least this similar reuse the cached SQL directly if they name the
+# same categories, quoted values and numbers. Other questions above
+# SEMANTIC_CACHE_VERIFY_THRESHOLD are verified by VERIFIER_MODEL first.
+SEMANTIC_CACHE_HIT_THRESHOLD = 0.92
+SEMANTIC_CACHE_VERIFY_THRESHOLD = 0.85
 
 LOG_FILE="./logs/sql_generation.log"
 os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
 
-def setup_logger(name: str = None):
-    formatter = logging.Formatter('%(asctime)s | %(levelname)s | %(name)s | %(message)s')
-
-    handler = logging.FileHandler(LOG_FILE)
-    handler.setFormatter(formatter)
+# File writes happen on the listener's background thread, so logging
+# never blocks a request on disk I/O.
+_log_queue = queue.Queue(-1)
+_file_handler = logging.FileHandler(LOG_FILE)
+_file_handler.setFormatter(logging.Formatter('%(asctime)s | %(levelname)s | %(name)s | %(message)s'))
+_log_listener = logging.handlers.QueueListener(_log_queue, _file_handler)
+_log_listener.start()
+atexit.register(_log_listener.stop)
 
-    console = logging.StreamHandler()
-    console.setFormatter(formatter)
+def setup_logger(name: str = None):
+    handler = logging.handlers.QueueHandler(_log_queue)
 
     logger = logging.getLogger(name)
     logger.setLevel(logging.INFO)
@@ -36,6 +77,5 @@ def setup_logger(name: str = None):
     # Avoid duplicate handlers
     if not logger.handlers:
         logger.addHandler(handler)
-        # logger.addHandler(console)
 
     return logger
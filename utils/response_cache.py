@@ -0,0 +1,232 @@
+"""
+This module provides a persistent cache for generated SQL queries.
+Entries are keyed by a hash of the model, temperature, prompt version and
+the normalized user question, and are stored in a local SQLite database.
+"""
+import json
+import time
+import asyncio
+import hashlib
+import sqlite3
+import functools
+from collections import OrderedDict
+from typing import Optional
+from utils.config import (MODEL, SQL_TEMPERATURE, RESPONSE_CACHE_PATH, RESPONSE_CACHE_TTL,
+                          RESPONSE_CACHE_MEMORY_SIZE, setup_logger)
+
+logger = setup_logger(__name__)
+
+def normalize_question(question: str) -> str:
+    """
+    Normalizes a question so trivially different spellings share a cache entry.
+
+    Parameters
+    ----------
+    question : str
+        The user's question in natural language.
+
+    Returns
+    -------
+    str
+        The lowercased question with surrounding and repeated whitespace removed.
+    """
+    return " ".join(question.lower().split())
+
+def make_cache_key(question: str, prompt_version: str, model: str = MODEL,
+                   temperature: float = SQL_TEMPERATURE) -> str:
+    """
+    Builds the cache key for a question.
+
+    Parameters
+    ----------
+    question : str
+        The user's question in natural language.
+    prompt_version : str
+        The version of the prompts (schema, guidelines and examples) used for generation.
+    model : str
+        The model used for generating SQL queries.
+    temperature : float
+        The temperature used for generating SQL queries.
+
+    Returns
+    -------
+    str
+        The SHA-256 hex digest identifying the cache entry.
+    """
+    norm_q = normalize_question(question)
+    return hashlib.sha256(f"{model}|{temperature}|{prompt_version}|{norm_q}".encode("utf-8")).hexdigest()
+
+def make_request_key(model: str, temperature: float, messages: list) -> str:
+    """
+    Builds the cache key for a single LLM request.
+
+    Parameters
+    ----------
+    model : str
+        The model the request is sent to.
+    temperature : float
+        The sampling temperature of the request.
+    messages : list
+        The chat messages of the request.
+
+    Returns
+    -------
+    str
+        The SHA-256 hex digest of a canonical JSON encoding of the request.
+    """
+    payload = json.dumps({"m": model, "t": temperature, "msgs": messages},
+                         sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    """
+    Stores generated SQL queries in a local SQLite database.
+    Entries expire after `ttl` seconds and are only served for the
+    prompt version they were generated with. Separate caches sharing
+    the database use separate tables. The most recently used entries are
+    also kept in an in-process LRU, so repeated lookups skip SQLite.
+
+    Attributes
+    ----------
+    prompt_version : str
+        The current prompt version, stored with every entry.
+    cache_path : str
+        Path to the SQLite cache database.
+    ttl : int
+        Number of seconds an entry stays valid.
+    table : str
+        Name of the cache table.
+    memory_size : int
+        Number of entries kept in memory.
+
+    Methods
+    -------
+    get(key) -> Optional[str]
+        Returns the cached SQL query for the key, or None on a miss.
+    set(key, sql)
+        Stores the SQL query for the key.
+    purge(max_age=None) -> int
+        Deletes expired entries, entries of other prompt versions and,
+        optionally, entries older than `max_age` seconds.
+    """
+    def __init__(self, prompt_version, cache_path=RESPONSE_CACHE_PATH, ttl=RESPONSE_CACHE_TTL, table="cache",
+                 memory_size=RESPONSE_CACHE_MEMORY_SIZE):
+        self.prompt_version = prompt_version
+        self.cache_path = cache_path
+        self.ttl = ttl
+        self.table = table
+        self.memory_size = memory_size
+        self._conn = None
+        self._memory = OrderedDict()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.cache_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                "key TEXT PRIMARY KEY, sql TEXT NOT NULL, expires_at REAL NOT NULL, "
+                "prompt_version TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+        return self._conn
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Returns the cached SQL query for the key.
+
+        Returns:
+            str: The cached SQL query, or None if the key is missing or expired.
+        """
+        entry = self._memory.get(key)
+        if entry is not None:
+            sql, expires_at = entry
+            if expires_at > time.time():
+                self._memory.move_to_end(key)
+                return sql
+            del self._memory[key]
+        row = self._connect().execute(
+            f"SELECT sql, expires_at FROM {self.table} WHERE key=? AND prompt_version=? AND expires_at > ?",
+            (key, self.prompt_version, time.time())
+        ).fetchone()
+        if row is None:
+            return None
+        self._remember(key, *row)
+        return row[0]
+
+    def set(self, key: str, sql: str):
+        """
+        Stores the SQL query for the key, replacing any previous entry.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, sql, expires_at, prompt_version, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, sql, now + self.ttl, self.prompt_version, now)
+            )
+        self._remember(key, sql, now + self.ttl)
+
+    def _remember(self, key: str, sql: str, expires_at: float):
+        self._memory[key] = (sql, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def purge(self, max_age: Optional[float] = None) -> int:
+        """
+        Deletes expired entries, entries of other prompt versions and,
+        if `max_age` is given, entries created more than `max_age` seconds ago.
+
+        Returns:
+            int: The number of deleted entries.
+        """
+        now = time.time()
+        min_created_at = now - max_age if max_age is not None else float("-inf")
+        self._memory.clear()
+        with self._connect() as conn:
+            return conn.execute(
+                f"DELETE FROM {self.table} WHERE expires_at <= ? OR prompt_version != ? OR created_at < ?",
+                (now, self.prompt_version, min_created_at)
+            ).rowcount
+
+def cached_response(prompt_version: str, cache: Optional[ResponseCache] = None):
+    """
+    Decorates an `async func(question, **kwargs) -> str` SQL generator with the response cache.
+    Concurrent calls for the same cache key share a single in-flight generation
+    instead of each issuing their own LLM requests. Keyword arguments are passed
+    through to `func` and are not part of the cache key.
+
+    Parameters
+    ----------
+    prompt_version : str
+        The version of the prompts used by `func`, which is part of the cache key.
+    cache : ResponseCache
+        The cache to use. A default `ResponseCache` is created when omitted.
+    """
+    cache = cache or ResponseCache(prompt_version)
+    inflight = {}
+
+    def decorator(func):
+        async def generate(key, question, **kwargs):
+            sql = await func(question, **kwargs)
+            cache.set(key, sql)
+            return sql
+
+        @functools.wraps(func)
+        async def wrapper(question, **kwargs):
+            key = make_cache_key(question, prompt_version)
+            sql = cache.get(key)
+            if sql is not None:
+                logger.info("Response cache hit for question: %s", question)
+                return sql
+            task = inflight.get(key)
+            if task is None:
+                task = asyncio.ensure_future(generate(key, question, **kwargs))
+                inflight[key] = task
+                task.add_done_callback(lambda _: inflight.pop(key, None))
+            else:
+                logger.info("Joining in-flight request for question: %s", question)
+            # Shielded, so a cancelled caller does not cancel the generation for the others.
+            return await asyncio.shield(task)
+        return wrapper
+    return decorator
@@ -1,11 +1,39 @@
 '''
     This class is responsible for reading the database schema from a specified file.
 '''
+import os
 import sqlite3
+import functools
+import threading
+from pathlib import Path
+from types import MappingProxyType
 from utils.config import setup_logger
 
 logger = setup_logger(__name__)
 
+# Always the same string, so sqlite3's statement cache reuses the prepared statement.
+_SELECT_CATEGORIES = ("SELECT product_category_name_english, product_category_name "
+                      "FROM product_category_name_translation")
+
+# Returned when the categories cannot be read, so callers always get a read-only mapping.
+_NO_CATEGORIES = MappingProxyType({})
+
+# Applied once per connection. The loader only reads reference data, so the
+# connection is query-only, with a large page cache and memory-mapped I/O.
+# journal_mode and synchronous only matter to writers and are left unchanged.
+_READER_PRAGMAS = (
+    "PRAGMA query_only=1",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-64000",
+)
+
+# Shared by all SchemaLoader instances, so loaders for the same file share one copy.
+@functools.lru_cache(maxsize=8)
+def _read_schema(schema_path: str) -> str:
+    with open(schema_path, 'r', encoding='utf-8') as file:
+        return file.read()
+
 class SchemaLoader:
     '''
     Loads the database schema from a file.
@@ -20,42 +48,87 @@ class SchemaLoader:
     -------
     get_schema() -> str
         Reads the database schema from the provided file.
+    read_product_categories() -> Mapping[str, str]
+        Reads product categories from the database.
+    invalidate_categories()
+        Drops the memoized product categories.
+    close()
+        Closes the database connection.
     '''
+    __slots__ = ("db_path", "schema_path", "_connect_path", "_schema", "_conn", "_categories",
+                 "_categories_lock")
+
     def __init__(self, db_path, schema_path):
         self.db_path = db_path
         self.schema_path = schema_path
+        # Resolved once, so a later change of working directory cannot redirect the connection.
+        # Read-only, so a missing database is reported instead of created empty.
+        self._connect_path = Path(os.path.abspath(db_path)).as_uri() + "?mode=ro"
+        self._schema = None
+        self._conn = None
+        self._categories = None
+        self._categories_lock = threading.Lock()
 
     def get_schema(self) -> str:
         """
         Reads the database schema from the provided file.
+        The file contents are read once and reused on later calls.
 
         Returns:
             str: Database schema as a string or an empty string if an error occurs.
         """
+        if self._schema is not None:
+            return self._schema
         try:
-            with open(self.schema_path, 'r', encoding='utf-8') as file:
-                return file.read()
+            self._schema = _read_schema(self.schema_path)
+            return self._schema
         except FileNotFoundError:
             logger.error("Schema file not found: %s", self.schema_path)
             return ""
 
+    def _get_conn(self) -> sqlite3.Connection:
+        # One long-lived connection, so SQLite's page cache stays warm between queries.
+        if self._conn is None:
+            self._conn = sqlite3.connect(self._connect_path, uri=True, check_same_thread=False,
+                                         cached_statements=128)
+            for pragma in _READER_PRAGMAS:
+                self._conn.execute(pragma)
+        return self._conn
+
+    def close(self):
+        """
+        Closes the database connection, if one was opened.
+        """
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def invalidate_categories(self):
+        """
+        Drops the memoized product categories, so the next call reads them again.
+        """
+        self._categories = None
+
     def read_product_categories(self):
         """
         Reads product categories from the database.
+        The query runs once and the result is reused on later calls.
 
         Returns:
-            dict: A dictinory of product categories and their trnaslation. 
+            Mapping: A read-only mapping of product categories and their trnaslation,
+            shared by all callers. Empty, and not memoized, if the database cannot be read.
             key-> english , value -> portugese
         """
+        if self._categories is not None:
+            return self._categories
         try:
-            with sqlite3.connect(self.db_path) as sqlite3_conn:
-                cursor = sqlite3_conn.cursor()
-                cursor.execute("SELECT * FROM product_category_name_translation")
-                product_categories = {row[1]: row[0] for row in cursor.fetchall()}
-                return product_categories
-        except FileNotFoundError:
-            logger.error("Database file not found: %s", self.db_path)
-            return []
-        finally:
-            if sqlite3_conn:
-                sqlite3_conn.close()
+            with self._categories_lock:
+                if self._categories is None:
+                    cursor = self._get_conn().execute(_SELECT_CATEGORIES)
+                    # Rows are (english, portugese) pairs, streamed straight into the dict.
+                    # Callers get a read-only view, so the shared dict cannot be mutated.
+                    self._categories = MappingProxyType(dict(cursor))
+                return self._categories
+        except sqlite3.Error as e:
+            logger.error("Could not read product categories from %s: %s", self.db_path, e)
+            return _NO_CATEGORIES
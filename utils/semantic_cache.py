@@ -0,0 +1,179 @@
+"""
+This module provides a semantic cache for generated SQL queries.
+Questions are matched by cosine similarity of their embeddings, so
+rephrasings of an already answered question can reuse its SQL query.
+"""
+import time
+import sqlite3
+from typing import NamedTuple, Optional
+import numpy as np
+from utils.config import RESPONSE_CACHE_PATH, RESPONSE_CACHE_TTL, EMBEDDING_MODEL, setup_logger
+
+logger = setup_logger(__name__)
+
+class SemanticMatch(NamedTuple):
+    """
+    The closest cached question for a lookup.
+    """
+    question: str
+    sql: str
+    similarity: float
+
+class SemanticCache:
+    """
+    Stores question embeddings and their SQL queries in a local SQLite database,
+    with an in-memory matrix of L2-normalized embeddings for inner-product search.
+
+    Attributes
+    ----------
+    prompt_version : str
+        The current prompt version and embedding model. Only entries generated
+        with both are used.
+    cache_path : str
+        Path to the SQLite cache database.
+    ttl : int
+        Number of seconds an entry stays valid.
+    embedding_model : str
+        The model the embeddings are computed with.
+
+    Methods
+    -------
+    lookup(embedding) -> Optional[SemanticMatch]
+        Returns the most similar cached question.
+    insert(question, embedding, sql)
+        Stores the question, its embedding and its SQL query.
+    purge(max_age=None) -> int
+        Deletes expired entries, entries of other prompt versions and,
+        optionally, entries older than `max_age` seconds.
+    """
+    def __init__(self, prompt_version, cache_path=RESPONSE_CACHE_PATH, ttl=RESPONSE_CACHE_TTL,
+                 embedding_model=EMBEDDING_MODEL):
+        # Embeddings of different models cannot be compared, and may differ in size,
+        # so entries of another embedding model are treated like another prompt version.
+        self.prompt_version = f"{prompt_version}:{embedding_model}"
+        self.cache_path = cache_path
+        self.ttl = ttl
+        self._conn = None
+        self._vectors = None
+        self._entries = []
+        self._expires_at = None
+        self._positions = {}
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.cache_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS semantic_cache ("
+                "question TEXT NOT NULL, prompt_version TEXT NOT NULL, embedding BLOB NOT NULL, "
+                "sql TEXT NOT NULL, expires_at REAL NOT NULL, created_at REAL NOT NULL, "
+                "PRIMARY KEY (question, prompt_version))"
+            )
+        return self._conn
+
+    def _load(self):
+        rows = self._connect().execute(
+            "SELECT question, sql, embedding, expires_at FROM semantic_cache "
+            "WHERE prompt_version=? AND expires_at > ?", (self.prompt_version, time.time())
+        ).fetchall()
+        self._entries = [(question, sql) for question, sql, _, _ in rows]
+        self._expires_at = np.array([row[3] for row in rows], dtype=np.float64)
+        self._positions = {question: i for i, (question, _) in enumerate(self._entries)}
+        if rows:
+            self._vectors = np.vstack([np.frombuffer(row[2], dtype=np.float32) for row in rows])
+        else:
+            self._vectors = np.empty((0, 0), dtype=np.float32)
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, embedding) -> Optional[SemanticMatch]:
+        """
+        Returns the most similar cached question.
+
+        Parameters
+        ----------
+        embedding : list
+            The embedding of the user's question.
+
+        Returns
+        -------
+        SemanticMatch
+            The closest unexpired cached question, its SQL query and the cosine
+            similarity, or None if there is none or the cache cannot be read.
+        """
+        try:
+            if self._vectors is None:
+                self._load()
+            if not self._entries:
+                return None
+            similarities = self._vectors @ self._normalize(embedding)
+        except (sqlite3.Error, ValueError) as e:
+            # A cache that cannot be searched is a miss; the query is generated instead.
+            logger.warning("Semantic cache lookup failed: %s", e)
+            return None
+        # Entries are loaded once, so they can expire while in memory.
+        expired = self._expires_at <= time.time()
+        if expired.all():
+            return None
+        similarities[expired] = -np.inf
+        best = int(np.argmax(similarities))
+        question, sql = self._entries[best]
+        return SemanticMatch(question, sql, float(similarities[best]))
+
+    def insert(self, question, embedding, sql):
+        """
+        Stores the question, its embedding and its SQL query, replacing
+        any previous entry for the question.
+        A failure is logged; the query is then just not reused.
+        """
+        try:
+            if self._vectors is None:
+                self._load()
+            vector = self._normalize(embedding)
+            # Checked first, so an embedding of another size is rejected before it is stored.
+            if self._vectors.size and vector.shape != self._vectors.shape[1:]:
+                raise ValueError(f"embedding has {vector.size} dimensions, "
+                                 f"cached embeddings have {self._vectors.shape[1]}")
+            now = time.time()
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO semantic_cache "
+                    "(question, prompt_version, embedding, sql, expires_at, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (question, self.prompt_version, vector.tobytes(), sql, now + self.ttl, now)
+                )
+            # Replaced in place like the SQLite row, so lookups cannot return the older query.
+            position = self._positions.get(question)
+            if position is None:
+                self._positions[question] = len(self._entries)
+                self._entries.append((question, sql))
+                self._expires_at = np.append(self._expires_at, now + self.ttl)
+                self._vectors = np.vstack([self._vectors, vector]) if self._vectors.size else vector[None, :]
+            else:
+                self._entries[position] = (question, sql)
+                self._expires_at[position] = now + self.ttl
+                self._vectors[position] = vector
+        except (sqlite3.Error, ValueError) as e:
+            logger.warning("Semantic cache insert failed: %s", e)
+
+    def purge(self, max_age: Optional[float] = None) -> int:
+        """
+        Deletes expired entries, entries of other prompt versions and,
+        if `max_age` is given, entries created more than `max_age` seconds ago.
+
+        Returns:
+            int: The number of deleted entries.
+        """
+        now = time.time()
+        min_created_at = now - max_age if max_age is not None else float("-inf")
+        with self._connect() as conn:
+            deleted = conn.execute(
+                "DELETE FROM semantic_cache WHERE expires_at <= ? OR prompt_version != ? OR created_at < ?",
+                (now, self.prompt_version, min_created_at)
+            ).rowcount
+        self._vectors = None
+        return deleted